@@ -0,0 +1,110 @@
+# card animation
+# cards on the move are drawn from a sprite list of their own, and every frame their positions
+# are worked out together in numpy and written straight into that sprite list's position buffer,
+# so a frame costs a few array operations however many cards are flying
+# the card sprites themselves are already at their destination, only what is drawn moves
+import numpy as np
+
+# seconds a card takes to reach its place
+MOVE_SECONDS = 0.15
+# seconds between cards starting to move when the tableau is dealt
+DEAL_STAGGER = 0.03
+# and when a batch of cards is sent up to the foundations
+SEND_STAGGER = 0.04
+
+
+def write_positions(layer, slots, positions):
+    # put positions (n x 2) into a sprite list's buffer at slots, in one go
+    # uses arcade 2.6's sprite list internals, which hold positions as an array of float32 x, y pairs,
+    # so requirements.txt keeps arcade below 2.7
+    # the buffer can grow when a sprite is added, so it is only viewed for as long as the write takes
+    buffer = np.frombuffer(layer._sprite_pos_data, dtype=np.float32).reshape(-1, 2)
+    buffer[slots] = positions
+    layer._sprite_pos_changed = True
+
+
+def layer_slots(layer, cards):
+    # where each card's data sits in a sprite list's buffers
+    return np.array([layer.sprite_slot[card] for card in cards], dtype=np.intp)
+
+
+class Animation:
+    def __init__(self, layer, seconds=MOVE_SECONDS):
+        # layer is the sprite list flying cards are drawn from, nothing else may use it
+        self.layer = layer
+        self.seconds = seconds
+        self.clear()
+
+    def clear(self):
+        # cards in flight, and a set of them to check against
+        self.cards = []
+        self.flying = set()
+        # a row per card, in the same order: start x, y, end x, y and the time it sets off
+        self.paths = np.empty((0, 5), dtype=np.float32)
+        # per card, its slot in the layer
+        self.slots = np.empty(0, dtype=np.intp)
+        # seconds since the first cards set off
+        self.elapsed = 0.0
+        # time to the last card landing
+        self.duration = 0.0
+
+    def add(self, cards, starts, delays=None):
+        # send cards flying from starts to where their sprites are now
+        # delays are seconds after now, all 0 if not given
+        # a card already flying (moved again within one batch) sets off afresh from where it is shown
+        if self.seconds <= 0 or not cards:
+            return
+        if delays is None:
+            delays = [0.0] * len(cards)
+        if not self.flying.isdisjoint(cards):
+            starts = self.drop(cards, starts)
+        for card in cards:
+            if card not in self.flying:
+                self.layer.append(card)
+        paths = np.array([(*start, *card.position, self.elapsed + delay)
+                          for card, start, delay in zip(cards, starts, delays)], dtype=np.float32)
+        slots = layer_slots(self.layer, cards)
+        if self.cards:
+            paths = np.concatenate((self.paths, paths))
+            slots = np.concatenate((self.slots, slots))
+        self.paths = paths
+        self.slots = slots
+        self.cards.extend(cards)
+        self.flying.update(cards)
+        self.duration = max(self.duration, self.elapsed + max(delays) + self.seconds)
+        # show them at their starts before the next step
+        self.step(0.0)
+
+    def drop(self, cards, starts):
+        # take the paths of any of cards already flying, leaving them in the layer
+        # returns starts with those cards' own replaced by where they are shown now
+        shown = self.positions()
+        rows = {card: row for row, card in enumerate(self.cards)}
+        starts = [tuple(shown[rows[card]]) if card in rows else start for card, start in zip(cards, starts)]
+        keep = np.array([card not in cards for card in self.cards], dtype=bool)
+        self.paths = self.paths[keep]
+        self.slots = self.slots[keep]
+        self.cards = [card for card, kept in zip(self.cards, keep) if kept]
+        return starts
+
+    def positions(self):
+        # where every flying card is shown now, an n x 2 array
+        done = np.clip((self.elapsed - self.paths[:, 4]) / self.seconds, 0.0, 1.0)
+        # ease out, fast at first and slowing into place
+        eased = 1.0 - (1.0 - done) ** 3
+        start = self.paths[:, 0:2]
+        return start + (self.paths[:, 2:4] - start) * eased[:, None]
+
+    def step(self, delta_time):
+        # move every flying card on, returns True once they have all landed
+        self.elapsed += delta_time
+        write_positions(self.layer, self.slots, self.positions())
+        return self.elapsed >= self.duration
+
+    def finish(self):
+        # land every flying card at once and empty the layer, returns the cards that were flying
+        cards = self.cards
+        while len(self.layer) > 0:
+            self.layer.pop()
+        self.clear()
+        return cards
@@ -0,0 +1,233 @@
+# headless benchmarks
+# times the game's hot paths over seeded, scripted input with no visible window, and writes
+# percentiles as JSON so runs from different commits can be compared
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+# must be set before arcade is imported
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+
+import arcade  # noqa: E402
+import numpy as np  # noqa: E402
+
+import klondike  # noqa: E402
+import layout  # noqa: E402
+import main as gui  # noqa: E402
+from klondike import MOVE, STOCK, TALON, TABLEAUS, FOUNDATIONS  # noqa: E402
+
+# runs of each benchmark
+RUNS = 200
+# a result more than this many times slower than the baseline is a regression
+THRESHOLD = 1.25
+
+
+def timed(samples, function, *args):
+    # call function, adding its time in microseconds to samples
+    started = time.perf_counter()
+    function(*args)
+    samples.append((time.perf_counter() - started) * 1e6)
+
+
+def new_game(game, rng):
+    # a fresh standard game on a seeded deal, dealt out and drawn once so the layers are up to date
+    gui.GAME_RULE = klondike.STANDARD
+    game.setup(rng.randrange(1000000))
+    game.land_cards()
+    game.on_draw()
+
+
+def play_some(game, rng, moves):
+    # make some random legal moves to get away from the opening position
+    for _ in range(moves):
+        legal = game.moves.moves()
+        if not legal:
+            break
+        game.apply_move(rng.choice(legal))
+    game.land_cards()
+    game.on_draw()
+
+
+def bench_setup(game, rng, samples):
+    gui.GAME_RULE = klondike.STANDARD
+    timed(samples, game.setup, rng.randrange(1000000))
+    game.on_draw()
+
+
+def bench_stock_press(game, rng, samples):
+    new_game(game, rng)
+    x, y = layout.PILE_POSITIONS[STOCK]
+    timed(samples, game.on_mouse_press, x, y, arcade.MOUSE_BUTTON_LEFT, 0)
+    game.on_mouse_release(x, y, arcade.MOUSE_BUTTON_LEFT, 0)
+
+
+def drag_and_drop(game, move):
+    # pick up the cards of a move, drag them onto the target pile and let go
+    kind, src, dst, count = move
+    x, y = layout.card_position(src, len(game.state.piles[src]) - count)
+    to_x, to_y = layout.card_position(dst, len(game.state.piles[dst]))
+    # grab a tableau card by the strip of it that shows above the next card
+    if src in TABLEAUS:
+        grip = layout.CARD_HEIGHT / 2 - layout.CARD_VERTICAL_OFFSET / 2
+        y += grip
+        to_y += grip
+    game.on_mouse_press(x, y, arcade.MOUSE_BUTTON_LEFT, 0)
+    game.on_mouse_motion(to_x, to_y, to_x - x, to_y - y)
+    game.on_mouse_release(to_x, to_y, arcade.MOUSE_BUTTON_LEFT, 0)
+
+
+def bench_drag_drop(game, rng, samples):
+    # a random legal card move, made with the mouse
+    for _ in range(100):
+        new_game(game, rng)
+        play_some(game, rng, rng.randrange(30))
+        moves = [move for move in game.moves.moves() if move.kind == MOVE and move.src != STOCK
+                 and (move.dst in TABLEAUS or move.dst in FOUNDATIONS)]
+        if moves:
+            move = rng.choice(moves)
+            size = len(game.state.piles[move.dst])
+            timed(samples, drag_and_drop, game, move)
+            assert len(game.state.piles[move.dst]) == size + move.count, "drop missed"
+            return
+
+
+def bench_right_click(game, rng, samples):
+    # right click a top card that has somewhere to go
+    for _ in range(100):
+        new_game(game, rng)
+        play_some(game, rng, rng.randrange(30))
+        sources = [src for src in (TALON, *TABLEAUS) if klondike.auto_move(game.state, src) is not None]
+        if sources:
+            src = rng.choice(sources)
+            x, y = layout.card_position(src, len(game.state.piles[src]) - 1)
+            timed(samples, game.on_mouse_press, x, y, arcade.MOUSE_BUTTON_RIGHT, 0)
+            return
+
+
+def bench_recycle(game, rng, samples):
+    # click the empty stock to turn the talon over
+    new_game(game, rng)
+    while game.state.piles[STOCK]:
+        game.apply_move(klondike.stock_move(game.state))
+    game.land_cards()
+    game.on_draw()
+    x, y = layout.PILE_POSITIONS[STOCK]
+    timed(samples, game.on_mouse_press, x, y, arcade.MOUSE_BUTTON_LEFT, 0)
+    assert game.state.piles[TALON] == bytearray(), "talon wasn't turned over"
+
+
+def bench_on_update(game, rng, samples):
+    # a frame with nothing happening, then one after a move
+    timed(samples, game.on_update, 1 / 60)
+    legal = game.moves.moves()
+    if legal:
+        game.apply_move(rng.choice(legal))
+    timed(samples, game.on_update, 1 / 60)
+
+
+def draw_frame(game):
+    game.on_draw()
+    # wait for the frame to finish rendering, not just be queued
+    game.ctx.finish()
+
+
+def bench_on_draw(game, rng, samples):
+    if rng.random() < 0.1:
+        new_game(game, rng)
+    legal = game.moves.moves()
+    if legal:
+        game.apply_move(rng.choice(legal))
+    timed(samples, draw_frame, game)
+
+
+BENCHMARKS = {
+    "setup": bench_setup,
+    "stock_press": bench_stock_press,
+    "drag_drop": bench_drag_drop,
+    "right_click": bench_right_click,
+    "recycle": bench_recycle,
+    "on_update": bench_on_update,
+    "on_draw": bench_on_draw,
+}
+
+
+def summary(samples):
+    # percentiles of a benchmark's times, in microseconds
+    times = np.array(samples)
+    p50, p90, p99 = np.percentile(times, (50, 90, 99))
+    return {
+        "n": len(times),
+        "mean_us": float(times.mean()),
+        "p50_us": float(p50),
+        "p90_us": float(p90),
+        "p99_us": float(p99),
+        "max_us": float(times.max()),
+    }
+
+
+def run(names, runs, seed):
+    game = gui.Game()
+    new_game(game, random.Random(seed))
+    results = {}
+    for name in names:
+        rng = random.Random(seed)
+        samples = []
+        # a few runs first so imports, caches and buffers are warm
+        for _ in range(5):
+            BENCHMARKS[name](game, rng, [])
+        while len(samples) < runs:
+            BENCHMARKS[name](game, rng, samples)
+        results[name] = summary(samples)
+    return results
+
+
+def compare(results, baseline, threshold):
+    # names of benchmarks whose median got more than threshold times slower, printed as it goes
+    regressions = []
+    for name, result in results["benchmarks"].items():
+        before = baseline["benchmarks"].get(name)
+        if before is None:
+            continue
+        ratio = result["p50_us"] / before["p50_us"]
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(f"{name}: p50 {before['p50_us']:.1f}us -> {result['p50_us']:.1f}us ({ratio:.2f}x){flag}",
+              file=sys.stderr)
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the game's hot paths headless and print JSON.")
+    parser.add_argument("--runs", type=int, default=RUNS, help="timed runs of each benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="seed for deals and scripted input")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help="comma separated benchmarks to run")
+    parser.add_argument("--out", default=None, help="write the JSON here as well as printing it")
+    parser.add_argument("--compare", default=None, metavar="BASELINE",
+                        help="JSON from an earlier run, fail if a median is --threshold times slower")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    results = {
+        "python": platform.python_version(),
+        "arcade": arcade.__version__,
+        "seed": args.seed,
+        "benchmarks": run(args.only.split(","), args.runs, args.seed),
+    }
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as out:
+            out.write(text + "\n")
+    if args.compare:
+        with open(args.compare) as baseline:
+            if compare(results, json.load(baseline), args.threshold):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
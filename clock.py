@@ -0,0 +1,45 @@
+# fixed step game clock
+# game time moves in whole ticks however often the window updates, so the timer and the
+# standard rules time penalty come out the same at any frame rate, or with no window at all
+import klondike
+
+# game clock resolution
+TICKS_PER_SECOND = 60
+
+
+class GameClock:
+    def __init__(self, rule):
+        # standard(3) or Vegas(1), only standard rules have a time penalty
+        self.rule = rule
+        self.ticks = 0
+        # part of a tick carried over to the next update
+        self.remainder = 0.0
+        # stopped once the game is won
+        self.running = True
+
+    @property
+    def seconds(self):
+        # whole seconds of play
+        return self.ticks // TICKS_PER_SECOND
+
+    def advance(self, delta_time):
+        # run the clock on by delta_time seconds of real time, returns the score change
+        self.remainder += delta_time * TICKS_PER_SECOND
+        # a tiny allowance so float rounding in frame times can't drop a tick at a whole number
+        ticks = int(self.remainder + 1e-9)
+        self.remainder -= ticks
+        return self.step(ticks)
+
+    def step(self, ticks=1):
+        # run the clock on by whole ticks, returns the score change
+        if not self.running or ticks <= 0:
+            return 0
+        before = self.seconds
+        self.ticks += ticks
+        if self.rule != klondike.STANDARD:
+            return 0
+        # a penalty for every TIME_PENALTY_SECONDS boundary passed, however many ticks that took
+        return klondike.time_penalty(before) - klondike.time_penalty(self.seconds)
+
+    def stop(self):
+        self.running = False
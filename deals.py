@@ -0,0 +1,44 @@
+# deal generation
+# every deal id always gives the same layout, whether dealt one at a time or a million at once
+import random
+
+import numpy as np
+
+from klondike import CARD_COUNT
+
+# deal ids are 0 .. MAX_DEAL_ID
+MAX_DEAL_ID = 2 ** 32 - 1
+
+_POSITIONS = np.arange(CARD_COUNT, dtype=np.uint64)
+
+
+def _mix(x):
+    # splitmix64 finaliser, turns a counter into a well spread random 64 bit number
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def deals(deal_ids):
+    # card orders for many deals at once, an (N, 52) uint8 array, top of the stock last
+    # each card gets a random 64 bit key from (deal id, position) and the deal is the cards
+    # sorted by key, which is a uniform shuffle (ties are too unlikely to matter)
+    ids = np.asarray(deal_ids, dtype=np.uint64).reshape(-1, 1)
+    keys = _mix(ids * np.uint64(CARD_COUNT) + _POSITIONS)
+    return np.argsort(keys, axis=1, kind="stable").astype(np.uint8)
+
+
+def deal_range(first, count):
+    # card orders for count deals in a row, starting at deal id first
+    return deals(np.arange(first, first + count, dtype=np.uint64))
+
+
+def deal(deal_id):
+    # card order for one deal, as a list
+    return deals([deal_id])[0].tolist()
+
+
+def random_deal_id():
+    # a fresh deal id for a new game
+    return random.randint(0, MAX_DEAL_ID)
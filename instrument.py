@@ -0,0 +1,215 @@
+# opt-in instrumentation
+# Instruments(game) swaps the game window's event handlers for timed wrappers on that one window,
+# so with it off nothing is wrapped and the game pays nothing for it
+# each call's time goes into a fixed size ring buffer per handler, F3 shows frame rate and
+# p50/p99 over the game, F4 starts and stops a cProfile capture, and the game's counters are
+# sampled once a second into a time series written out when the window closes
+# texture loads are counted by wrapping arcade's load_texture, see count_texture_loads()
+import cProfile
+import csv
+import functools
+import json
+import time
+from collections import deque
+
+import arcade
+import arcade.sprite
+import arcade.texture
+import numpy as np
+
+from layout import SCREEN_HEIGHT
+
+# handlers timed
+HANDLERS = ("on_draw", "on_update", "on_mouse_press", "on_mouse_release", "on_mouse_motion", "setup")
+# calls kept per handler
+RING_SIZE = 1024
+# seconds between counter samples, which is also how often the overlay changes
+SAMPLE_SECONDS = 1.0
+# samples kept, an hour's worth
+SERIES_SIZE = 3600
+
+OVERLAY_KEY = arcade.key.F3
+PROFILE_KEY = arcade.key.F4
+# profile captures are written here, numbered from 1
+PROFILE_FILE = "profile-{number}.prof"
+
+# calls to load_texture since count_texture_loads(), by the game or by arcade, cached or not
+texture_loads = 0
+
+
+def count_texture_loads():
+    # wrap arcade's load_texture so every call from then on adds to texture_loads, under each
+    # name it is called by (arcade's sprites import their own copy of it)
+    # called before the window loads its textures, so those count too; wraps only once
+    load_texture = arcade.texture.load_texture
+    if getattr(load_texture, "counted", False):
+        return
+
+    # wraps() carries over the texture cache arcade keeps on the function
+    @functools.wraps(load_texture)
+    def counted_load_texture(*args, **kwargs):
+        global texture_loads
+        texture_loads += 1
+        return load_texture(*args, **kwargs)
+    counted_load_texture.counted = True
+    for module in (arcade, arcade.texture, arcade.sprite):
+        module.load_texture = counted_load_texture
+
+
+class Ring:
+    # the last size values added, in a buffer allocated once
+    def __init__(self, size=RING_SIZE):
+        self.values = np.zeros(size)
+        self.count = 0
+
+    def add(self, value):
+        self.values[self.count % len(self.values)] = value
+        self.count += 1
+
+    def recent(self):
+        # the values held, in no particular order, which percentiles don't need
+        return self.values[:min(self.count, len(self.values))]
+
+
+class Instruments:
+    def __init__(self, game, counters_path=None):
+        # counters_path is where the counter time series goes, .csv or else JSON
+        self.game = game
+        self.counters_path = counters_path
+        self.rings = {name: Ring() for name in HANDLERS}
+        # one dict per sample, oldest dropped first
+        self.series = deque(maxlen=SERIES_SIZE)
+        self.started = time.perf_counter()
+        self.sampled = self.started
+        self.frames_sampled = game.frames_drawn
+        self.fps = 0.0
+        self.profile = None
+        self.profiles_written = 0
+        self.show_overlay = False
+        self.overlay_text = arcade.Text(
+            text="",
+            start_x=10,
+            start_y=SCREEN_HEIGHT - 10,
+            color=arcade.color.BLACK,
+            font_size=10,
+            width=500,
+            anchor_y="top",
+            multiline=True,
+            font_name="courier",
+        )
+        for name in HANDLERS:
+            setattr(game, name, self.timed(self.rings[name], getattr(game, name)))
+        # the overlay is drawn after the timed on_draw, so its own cost isn't counted
+        timed_draw = game.on_draw
+        timed_update = game.on_update
+        key_press = game.on_key_press
+        close = game.on_close
+
+        def on_draw():
+            timed_draw()
+            if self.show_overlay and game.drew_frame:
+                self.overlay_text.draw()
+
+        def on_update(delta_time):
+            timed_update(delta_time)
+            if time.perf_counter() - self.sampled >= SAMPLE_SECONDS:
+                self.sample()
+
+        def on_key_press(symbol, modifiers):
+            if symbol == OVERLAY_KEY:
+                self.show_overlay = not self.show_overlay
+                if self.show_overlay:
+                    self.sample()
+                game.redraw()
+                return
+            if symbol == PROFILE_KEY:
+                self.toggle_profile()
+                return
+            return key_press(symbol, modifiers)
+
+        def on_close():
+            self.close()
+            close()
+
+        game.on_draw = on_draw
+        game.on_update = on_update
+        game.on_key_press = on_key_press
+        game.on_close = on_close
+
+    @staticmethod
+    def timed(ring, handler):
+        # handler, adding the seconds each call takes to ring
+        clock = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            started = clock()
+            result = handler(*args, **kwargs)
+            ring.add(clock() - started)
+            return result
+        return wrapper
+
+    def counters(self):
+        # running totals kept by the game itself
+        return {
+            "frames": self.game.frames_drawn,
+            "texture_loads": texture_loads,
+            "sprite_list_changes": self.game.layer_changes,
+            "collision_checks": self.game.hit_tests,
+        }
+
+    def sample(self):
+        # add a row to the time series and bring the overlay up to date
+        now = time.perf_counter()
+        frames = self.game.frames_drawn
+        self.fps = (frames - self.frames_sampled) / (now - self.sampled)
+        self.sampled = now
+        self.frames_sampled = frames
+        row = {"time": round(now - self.started, 3), "fps": round(self.fps, 1), **self.counters()}
+        lines = [f"fps {self.fps:5.1f}"]
+        for name, ring in self.rings.items():
+            row[f"{name}_calls"] = ring.count
+            if ring.count:
+                p50, p99 = np.percentile(ring.recent(), (50, 99)) * 1000
+                row[f"{name}_p50_ms"] = round(p50, 3)
+                row[f"{name}_p99_ms"] = round(p99, 3)
+                lines.append(f"{name:<16} p50 {p50:7.2f}ms  p99 {p99:7.2f}ms")
+        self.series.append(row)
+        if self.show_overlay:
+            self.overlay_text.text = "\n".join(lines)
+            # power save mode wouldn't draw the new numbers otherwise
+            self.game.redraw()
+
+    def toggle_profile(self):
+        # start a cProfile capture, or stop the running one and write it out
+        if self.profile is None:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+            print("profiling")
+            return
+        self.profile.disable()
+        self.profiles_written += 1
+        path = PROFILE_FILE.format(number=self.profiles_written)
+        self.profile.dump_stats(path)
+        self.profile = None
+        print(f"profile written to {path}, view it with: python -m pstats {path}")
+
+    def export(self, path):
+        # write the counter time series, as CSV if the file name ends in .csv and JSON otherwise
+        rows = list(self.series)
+        if path.endswith(".csv"):
+            # handlers not called yet leave columns out of the early rows
+            fields = list(dict.fromkeys(field for row in rows for field in row))
+            with open(path, "w", newline="") as out:
+                writer = csv.DictWriter(out, fields)
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            with open(path, "w") as out:
+                json.dump(rows, out, indent=1)
+
+    def close(self):
+        if self.profile is not None:
+            self.toggle_profile()
+        if self.counters_path:
+            self.sample()
+            self.export(self.counters_path)
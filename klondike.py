@@ -0,0 +1,553 @@
+# headless klondike rules
+# no arcade or window needed, so rules can run on servers, in solvers and in tests
+import struct
+from collections import deque, namedtuple
+
+# enums for card values and suits
+CARD_VALUES = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
+CARD_SUITS = ["Clubs", "Hearts", "Spades", "Diamonds"]
+
+# cards are ints 0-51, suit * 13 + rank
+CARD_COUNT = 52
+ACE = 0
+KING = 12
+
+# lookup tables indexed by card
+RANK = bytes(card % 13 for card in range(CARD_COUNT))
+SUIT = bytes(card // 13 for card in range(CARD_COUNT))
+# 0 for black (clubs, spades), 1 for red (hearts, diamonds)
+COLOR = bytes(SUIT[card] % 2 for card in range(CARD_COUNT))
+
+
+class CardInfo(namedtuple("CardInfo", "id rank suit color")):
+    # what a card is, immutable and shared, one per card number in CARDS
+    # rank 0-12, suit index into CARD_SUITS, colour 0 black or 1 red
+    __slots__ = ()
+
+    @property
+    def value(self):
+        return CARD_VALUES[self.rank]
+
+    @property
+    def suit_name(self):
+        return CARD_SUITS[self.suit]
+
+
+CARDS = tuple(CardInfo(card, RANK[card], SUIT[card], COLOR[card]) for card in range(CARD_COUNT))
+
+# can card go on top of another card, indexed by card * 52 + top card
+FITS_TABLEAU = bytes(
+    RANK[top] == RANK[card] + 1 and COLOR[top] != COLOR[card]
+    for card in range(CARD_COUNT) for top in range(CARD_COUNT)
+)
+FITS_FOUNDATION = bytes(
+    RANK[top] + 1 == RANK[card] and SUIT[top] == SUIT[card]
+    for card in range(CARD_COUNT) for top in range(CARD_COUNT)
+)
+
+# pile indexes
+PILE_COUNT = 13
+STOCK = 0
+TALON = 1
+TABLEAU_1 = 2
+TABLEAU_2 = 3
+TABLEAU_3 = 4
+TABLEAU_4 = 5
+TABLEAU_5 = 6
+TABLEAU_6 = 7
+TABLEAU_7 = 8
+FOUNDATION_1 = 9
+FOUNDATION_2 = 10
+FOUNDATION_3 = 11
+FOUNDATION_4 = 12
+TABLEAUS = range(TABLEAU_1, TABLEAU_7 + 1)
+FOUNDATIONS = range(FOUNDATION_1, FOUNDATION_4 + 1)
+# piles a single card can be taken from, onto the foundations or the tableau
+SINGLE_SOURCES = (TALON,) + tuple(TABLEAUS)
+CARD_SOURCES = (TALON,) + tuple(FOUNDATIONS)
+
+# game rules, standard(3) or Vegas(1), also how many cards a draw turns over
+STANDARD = 3
+VEGAS = 1
+
+# scoring
+FOUNDATION_SCORE = 10         # standard, card onto a foundation
+TABLEAU_SCORE = 5             # standard, card or stack onto a tableau
+FLIP_SCORE = 5                # standard, turning over a tableau card
+RECYCLE_SCORE = -20           # standard, talon back into the stock
+VEGAS_FOUNDATION_SCORE = 5    # vegas, card onto a foundation
+VEGAS_BUY_IN = -52            # vegas, paid for every new game
+WIN_BONUS = 700000            # standard, divided by the seconds taken to win
+TIME_PENALTY = 2              # standard, taken off every TIME_PENALTY_SECONDS of play
+TIME_PENALTY_SECONDS = 10
+
+# move kinds
+DRAW = 0      # stock to talon
+RECYCLE = 1   # whole talon back into the stock
+FLIP = 2      # turn over the top card of a tableau pile
+MOVE = 3      # count cards from the top of src onto dst
+Move = namedtuple("Move", "kind src dst count")
+
+# a move that was made and the score it gave, what undo and redo keep
+# (a flip is a FLIP move, so src, dst, count and the flip flag are all in the move)
+Delta = namedtuple("Delta", "move score")
+
+# most moves undo remembers by default
+HISTORY_LIMIT = 1000
+
+# packed state header: rule, score, the length of every pile and the face down count of every
+# tableau pile, followed by the cards of each pile in turn
+PACK_HEADER = struct.Struct(f"<Bd{PILE_COUNT}B{len(TABLEAUS)}B")
+
+
+class State:
+    # one game position
+    # piles: 13 bytearrays of cards, bottom first
+    # down: how many cards at the bottom of each pile are face down (tableau only,
+    # the stock is always face down and the talon and foundations face up)
+    __slots__ = ("piles", "down", "rule", "score")
+
+    def __init__(self, piles, down, rule=STANDARD, score=0):
+        self.piles = piles
+        self.down = down
+        self.rule = rule
+        self.score = score
+
+    def copy(self):
+        return State([bytearray(pile) for pile in self.piles], bytearray(self.down), self.rule, self.score)
+
+    def pack(self):
+        # the whole position as 81 bytes, for storing, sending or hashing
+        lengths = map(len, self.piles)
+        header = PACK_HEADER.pack(self.rule, self.score, *lengths, *self.down[TABLEAU_1:TABLEAU_7 + 1])
+        return header + b"".join(self.piles)
+
+    @classmethod
+    def unpack(cls, data):
+        # a state from State.pack()
+        fields = PACK_HEADER.unpack_from(data)
+        rule, score = fields[0], fields[1]
+        down = bytearray(PILE_COUNT)
+        down[TABLEAU_1:TABLEAU_7 + 1] = bytes(fields[2 + PILE_COUNT:])
+        piles = []
+        offset = PACK_HEADER.size
+        for length in fields[2:2 + PILE_COUNT]:
+            piles.append(bytearray(data[offset:offset + length]))
+            offset += length
+        return cls(piles, down, rule, score)
+
+    def is_face_up(self, pile_index, slot):
+        # is the card at this slot of the pile face up?
+        if pile_index == STOCK:
+            return False
+        return slot >= self.down[pile_index]
+
+
+def deal(order, rule=STANDARD, score=0):
+    # deal a new game, order is the 52 cards with the top of the stock last
+    piles = [bytearray() for _ in range(PILE_COUNT)]
+    down = bytearray(PILE_COUNT)
+    piles[STOCK].extend(order)
+    # pull from stock to deal, one column at a time
+    for pile_no in TABLEAUS:
+        for _ in range(pile_no - TABLEAU_1 + 1):
+            piles[pile_no].append(piles[STOCK].pop())
+        # only the top card is face up
+        down[pile_no] = len(piles[pile_no]) - 1
+    return State(piles, down, rule, score)
+
+
+def is_won(state):
+    # every card is on a foundation
+    piles = state.piles
+    return sum(len(piles[i]) for i in FOUNDATIONS) == CARD_COUNT
+
+
+def win_bonus(seconds):
+    # standard rules bonus for winning after this many whole seconds
+    return WIN_BONUS / max(1, seconds)
+
+
+def time_penalty(seconds):
+    # standard rules penalty for this many whole seconds of play
+    return TIME_PENALTY * (int(seconds) // TIME_PENALTY_SECONDS)
+
+
+def stock_move(state):
+    # draw from the stock, or turn the talon over if the stock is empty
+    piles = state.piles
+    if piles[STOCK]:
+        return Move(DRAW, STOCK, TALON, min(state.rule, len(piles[STOCK])))
+    # only standard rules may go through the stock again
+    if piles[TALON] and state.rule == STANDARD:
+        return Move(RECYCLE, TALON, STOCK, len(piles[TALON]))
+    return None
+
+
+def fits(state, card, dst):
+    # can this card be placed on top of dst?
+    pile = state.piles[dst]
+    if dst in FOUNDATIONS:
+        if not pile:
+            return RANK[card] == ACE
+        return FITS_FOUNDATION[card * CARD_COUNT + pile[-1]]
+    if dst in TABLEAUS:
+        if not pile:
+            return RANK[card] == KING
+        return state.down[dst] < len(pile) and FITS_TABLEAU[card * CARD_COUNT + pile[-1]]
+    return False
+
+
+def is_legal(state, move):
+    kind, src, dst, count = move
+    if kind == DRAW or kind == RECYCLE:
+        return move == stock_move(state)
+    pile = state.piles[src]
+    if kind == FLIP:
+        return (dst == src and count == 0 and src in TABLEAUS and len(pile) > 0
+                and state.down[src] == len(pile))
+    if src == dst or count < 1 or src == STOCK:
+        return False
+    # only face up cards can be picked up
+    if count > len(pile) - state.down[src]:
+        return False
+    # only tableau piles give up more than one card, and foundations only take one
+    if count > 1 and (src not in TABLEAUS or dst not in TABLEAUS):
+        return False
+    # cards never go back to the talon, or between foundations
+    if dst == TALON or (src in FOUNDATIONS and dst in FOUNDATIONS):
+        return False
+    return fits(state, pile[-count], dst)
+
+
+def legal_moves(state):
+    piles = state.piles
+    down = state.down
+    moves = []
+
+    move = stock_move(state)
+    if move is not None:
+        moves.append(move)
+
+    # what each pile would take next: a card number, or -1 for an empty pile
+    # (ace on a foundation, king on a tableau), or None if it takes nothing
+    tops = [None] * PILE_COUNT
+    for dst in FOUNDATIONS:
+        pile = piles[dst]
+        tops[dst] = pile[-1] if pile else -1
+    for dst in TABLEAUS:
+        pile = piles[dst]
+        if not pile:
+            tops[dst] = -1
+        elif down[dst] < len(pile):
+            tops[dst] = pile[-1]
+        else:
+            moves.append(Move(FLIP, dst, dst, 0))
+
+    # single cards onto the foundations
+    for src in SINGLE_SOURCES:
+        pile = piles[src]
+        if len(pile) <= down[src]:
+            continue
+        card = pile[-1]
+        row = card * CARD_COUNT
+        for dst in FOUNDATIONS:
+            top = tops[dst]
+            if (RANK[card] == ACE) if top < 0 else FITS_FOUNDATION[row + top]:
+                moves.append(Move(MOVE, src, dst, 1))
+
+    # single cards from the talon and foundations onto the tableau
+    for src in CARD_SOURCES:
+        pile = piles[src]
+        if not pile:
+            continue
+        card = pile[-1]
+        row = card * CARD_COUNT
+        for dst in TABLEAUS:
+            top = tops[dst]
+            if top is not None and ((RANK[card] == KING) if top < 0 else FITS_TABLEAU[row + top]):
+                moves.append(Move(MOVE, src, dst, 1))
+
+    # face up stacks between tableau piles
+    for src in TABLEAUS:
+        pile = piles[src]
+        size = len(pile)
+        for count in range(1, size - down[src] + 1):
+            card = pile[size - count]
+            row = card * CARD_COUNT
+            for dst in TABLEAUS:
+                top = tops[dst]
+                if top is None or dst == src:
+                    continue
+                if (RANK[card] == KING) if top < 0 else FITS_TABLEAU[row + top]:
+                    moves.append(Move(MOVE, src, dst, count))
+    return moves
+
+
+def pile_moves(state, src, dst):
+    # legal moves taking cards from src onto dst, or turning over the top of src when src == dst
+    pile = state.piles[src]
+    down = state.down
+    size = len(pile)
+    if src == dst:
+        if src in TABLEAUS and size and down[src] == size:
+            return (Move(FLIP, src, src, 0),)
+        return ()
+    face_up = size - down[src]
+    # nothing goes onto the stock or talon, or between foundations
+    if src == STOCK or face_up <= 0 or dst < TABLEAU_1 or (src >= FOUNDATION_1 and dst >= FOUNDATION_1):
+        return ()
+    target = state.piles[dst]
+    if dst >= FOUNDATION_1:
+        card = pile[-1]
+        if (RANK[card] == ACE) if not target else FITS_FOUNDATION[card * CARD_COUNT + target[-1]]:
+            return (Move(MOVE, src, dst, 1),)
+        return ()
+    if target and down[dst] == len(target):
+        return ()
+    # a stack only ever fits one way, since the pile it lands on decides its bottom card
+    for count in range(1, face_up + 1 if src < FOUNDATION_1 and src != TALON else 2):
+        card = pile[size - count]
+        if FITS_TABLEAU[card * CARD_COUNT + target[-1]] if target else RANK[card] == KING:
+            return (Move(MOVE, src, dst, count),)
+    return ()
+
+
+def touched_piles(move):
+    # piles whose cards change when a move is applied
+    if move.kind == FLIP:
+        return (move.src,)
+    return (move.src, move.dst)
+
+
+# piles that cards can ever move onto from each pile, and the other way round
+# (turning over a card counts as a move from a pile onto itself)
+MOVES_FROM = [
+    [dst for dst in range(PILE_COUNT) if (src == dst and src in TABLEAUS) or (
+        src != dst and src != STOCK and dst >= TABLEAU_1 and not (src in FOUNDATIONS and dst in FOUNDATIONS))]
+    for src in range(PILE_COUNT)
+]
+MOVES_TO = [[src for src in range(PILE_COUNT) if dst in MOVES_FROM[src]] for dst in range(PILE_COUNT)]
+
+
+class MoveGenerator:
+    # keeps the legal moves of a state up to date as moves are applied
+    # moves are cached per (src, dst) pair, and a move only recomputes the pairs
+    # involving the piles it touched
+    def __init__(self, state):
+        self.state = state
+        self.pairs = [[() for _ in range(PILE_COUNT)] for _ in range(PILE_COUNT)]
+        self.stock = None
+        self.refresh(range(PILE_COUNT))
+
+    def refresh(self, changed):
+        # recompute the moves from and onto the given piles
+        state = self.state
+        pairs = self.pairs
+        for pile in changed:
+            for dst in MOVES_FROM[pile]:
+                pairs[pile][dst] = pile_moves(state, pile, dst)
+            for src in MOVES_TO[pile]:
+                if src not in changed:
+                    pairs[src][pile] = pile_moves(state, src, pile)
+        self.stock = stock_move(state)
+
+    def apply(self, move):
+        # apply a legal move to the state, returns the score change
+        score = apply_move(self.state, move)
+        self.refresh(touched_piles(move))
+        return score
+
+    def undo(self, move):
+        # take back the last move applied, returns the score change undone
+        score = undo_move(self.state, move)
+        self.refresh(touched_piles(move))
+        return score
+
+    def is_legal(self, move):
+        if move.kind == DRAW or move.kind == RECYCLE:
+            return move == self.stock
+        return move in self.pairs[move.src][move.dst]
+
+    def moves(self):
+        # every legal move right now
+        moves = [] if self.stock is None else [self.stock]
+        for row in self.pairs:
+            for pair in row:
+                moves.extend(pair)
+        return moves
+
+    def best(self):
+        # the move a hint should suggest, or None if there are no moves left
+        return max(self.moves(), key=lambda move: move_priority(self.state, move), default=None)
+
+
+class History:
+    # undo and redo for one game, kept as Deltas rather than copies of the board
+    # only the last limit moves can be undone, older ones are dropped as new ones come in
+    def __init__(self, limit=HISTORY_LIMIT):
+        self.done = deque(maxlen=limit)
+        self.undone = []
+
+    def record(self, move, score):
+        # a new move, which also ends any redo
+        self.done.append(Delta(move, score))
+        self.undone.clear()
+
+    def undo(self):
+        # the Delta to take back, or None if there is nothing to undo
+        if not self.done:
+            return None
+        delta = self.done.pop()
+        self.undone.append(delta)
+        return delta
+
+    def redo(self):
+        # the Delta to make again, or None if there is nothing to redo
+        if not self.undone:
+            return None
+        delta = self.undone.pop()
+        self.done.append(delta)
+        return delta
+
+
+def move_priority(state, move):
+    # how good a move looks for a hint, higher is better
+    kind, src, dst, count = move
+    if kind == FLIP:
+        return 7
+    if kind == MOVE:
+        piles = state.piles
+        if dst in FOUNDATIONS:
+            return 6
+        if src in TABLEAUS:
+            # a whole face up stack moved off a face down card turns it over next
+            if count == len(piles[src]) - state.down[src] and state.down[src] > 0:
+                return 5
+            # kings that are already at the bottom of a pile gain nothing
+            if count == len(piles[src]):
+                return 0
+            # taking part of a stack can free a card for a foundation
+            card = piles[src][-count - 1]
+            for foundation in FOUNDATIONS:
+                if fits(state, card, foundation):
+                    return 3
+            return 0
+        if src == TALON:
+            return 4
+        # cards coming back off a foundation are a last resort
+        return 0
+    # drawing keeps the game going when nothing on the table helps
+    return 1
+
+
+def move_score(state, move):
+    # score change for a legal move, before it is applied
+    kind, src, dst, count = move
+    # a card taken back off a foundation gives back what it scored going up
+    if state.rule == VEGAS:
+        if kind == MOVE and dst in FOUNDATIONS:
+            return VEGAS_FOUNDATION_SCORE
+        if kind == MOVE and src in FOUNDATIONS:
+            return -VEGAS_FOUNDATION_SCORE
+        return 0
+    if kind == RECYCLE:
+        return RECYCLE_SCORE
+    if kind == FLIP:
+        return FLIP_SCORE
+    if kind == MOVE:
+        if dst in FOUNDATIONS:
+            return FOUNDATION_SCORE
+        if src in FOUNDATIONS:
+            return -FOUNDATION_SCORE
+        return TABLEAU_SCORE
+    return 0
+
+
+def apply_move(state, move):
+    # apply a legal move to the state in place, returns the score change
+    kind, src, dst, count = move
+    piles = state.piles
+    if kind == DRAW or kind == RECYCLE:
+        # cards are turned over one at a time, so their order reverses
+        src_pile = piles[src]
+        piles[dst].extend(reversed(src_pile[-count:]))
+        del src_pile[-count:]
+    elif kind == FLIP:
+        state.down[src] -= 1
+    else:
+        src_pile = piles[src]
+        piles[dst].extend(src_pile[-count:])
+        del src_pile[-count:]
+    score = move_score(state, move)
+    state.score += score
+    return score
+
+
+def undo_move(state, move):
+    # take back a move that was just applied, returns the score change undone
+    kind, src, dst, count = move
+    piles = state.piles
+    if kind == DRAW or kind == RECYCLE:
+        dst_pile = piles[dst]
+        piles[src].extend(reversed(dst_pile[-count:]))
+        del dst_pile[-count:]
+    elif kind == FLIP:
+        state.down[src] += 1
+    else:
+        dst_pile = piles[dst]
+        piles[src].extend(dst_pile[-count:])
+        del dst_pile[-count:]
+    score = move_score(state, move)
+    state.score -= score
+    return score
+
+
+def can_auto_complete(state):
+    # nothing is left to chance: the stock and talon are empty and every tableau card is face up,
+    # so the tableau piles are all in order and sending cards up in any order wins
+    piles = state.piles
+    return not piles[STOCK] and not piles[TALON] and not any(state.down[pile_index] for pile_index in TABLEAUS)
+
+
+def foundation_moves(state):
+    # every card that can go up onto the foundations from here, as the moves that put them there
+    # in order, turning over any face down tableau card that comes to the top on the way
+    # worked out on a copy, the state passed in isn't changed
+    state = state.copy()
+    piles = state.piles
+    moves = []
+    sent = True
+    while sent:
+        sent = False
+        for src in SINGLE_SOURCES:
+            pile = piles[src]
+            while pile:
+                if len(pile) == state.down[src]:
+                    move = Move(FLIP, src, src, 0)
+                else:
+                    for dst in FOUNDATIONS:
+                        if fits(state, pile[-1], dst):
+                            move = Move(MOVE, src, dst, 1)
+                            break
+                    else:
+                        break
+                apply_move(state, move)
+                moves.append(move)
+                sent = True
+    return moves
+
+
+def auto_move(state, src):
+    # where the top card of a pile should go on a right click:
+    # turn it over if face down, else the first foundation then tableau pile that takes it
+    pile = state.piles[src]
+    if src == STOCK or not pile:
+        return None
+    if len(pile) == state.down[src]:
+        return Move(FLIP, src, src, 0)
+    for dst in range(FOUNDATION_4, TABLEAU_1 - 1, -1):
+        move = Move(MOVE, src, dst, 1)
+        if is_legal(state, move):
+            return move
+    return None
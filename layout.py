@@ -0,0 +1,138 @@
+# table layout and hit testing
+# the piles sit on a fixed grid, so what is under the mouse can be worked out directly
+# instead of testing every sprite
+from klondike import PILE_COUNT, STOCK, TALON, TABLEAU_1, TABLEAUS, FOUNDATION_1, FOUNDATIONS
+
+# screen parameters
+SCREEN_WIDTH = 1024
+SCREEN_HEIGHT = 768
+
+# card parameters
+# Scaling component of card sizes
+CARD_SCALE = 0.6
+
+# ratio component of card sizes
+CARD_WIDTH = 140 * CARD_SCALE
+CARD_HEIGHT = 190 * CARD_SCALE
+
+# the card images have rounded corners, which their hit boxes cut off this far along each edge
+CARD_CORNER = 2 * CARD_SCALE
+
+# how big is each mat (spot to put a card on)
+MAT_PERCENT_OVERSIZE = 1.25
+MAT_WIDTH = int(CARD_WIDTH * MAT_PERCENT_OVERSIZE)
+MAT_HEIGHT = int(CARD_HEIGHT * MAT_PERCENT_OVERSIZE)
+
+# how far apart are mats as a percentage of mat size?
+VERTICAL_MARGIN_PERCENT = 0.10
+HORIZONTAL_MARGIN_PERCENT = 0.10
+
+# how far up should the stockpile and talon be?
+BOTTOM_Y = MAT_HEIGHT / 2 + MAT_HEIGHT * VERTICAL_MARGIN_PERCENT
+
+# How far from the left should the first stack be?
+START_X = MAT_WIDTH/2 + MAT_WIDTH*HORIZONTAL_MARGIN_PERCENT
+
+# how far from the top should the foundations be?
+TOP_Y = SCREEN_HEIGHT - MAT_HEIGHT/2 - MAT_HEIGHT*VERTICAL_MARGIN_PERCENT
+
+# how far from the top should the tableau be?
+MIDDLE_Y = TOP_Y - MAT_HEIGHT - MAT_HEIGHT*VERTICAL_MARGIN_PERCENT
+
+# how far apart should each mat be?
+X_SPACING = MAT_WIDTH + MAT_WIDTH*HORIZONTAL_MARGIN_PERCENT
+
+# How far apart should stacked tableau cards be?
+CARD_VERTICAL_OFFSET = CARD_HEIGHT * CARD_SCALE * 0.3
+
+# where each pile's mat sits
+PILE_POSITIONS = (
+    [(START_X, BOTTOM_Y), (START_X + X_SPACING, BOTTOM_Y)]
+    + [(START_X + i * X_SPACING, MIDDLE_Y) for i in range(len(TABLEAUS))]
+    + [(START_X + i * X_SPACING, TOP_Y) for i in range(len(FOUNDATIONS))]
+)
+
+
+def card_position(pile_index, slot):
+    # where a card belongs, tableau cards fan downwards and every other pile is a neat stack
+    x, y = PILE_POSITIONS[pile_index]
+    if pile_index in TABLEAUS:
+        return x, y - CARD_VERTICAL_OFFSET * slot
+    return x, y
+
+
+def in_box(x, y, box_x, box_y, width, height):
+    # is a point inside a box centred on (box_x, box_y)? the left and bottom edges are just outside
+    # and the right and top edges inside, as with sprite hit boxes
+    return (box_x - width / 2 < x <= box_x + width / 2) and (box_y - height / 2 < y <= box_y + height / 2)
+
+
+def on_card(x, y, card_x, card_y):
+    # is a point on a card centred on (card_x, card_y), corners and all?
+    if not in_box(x, y, card_x, card_y, CARD_WIDTH, CARD_HEIGHT):
+        return False
+    return CARD_WIDTH / 2 - abs(x - card_x) + CARD_HEIGHT / 2 - abs(y - card_y) >= CARD_CORNER
+
+
+def card_at(pile_index, slot_count, x, y):
+    # slot of the top card of a pile under a point, or None
+    if slot_count == 0:
+        return None
+    mat_x, mat_y = PILE_POSITIONS[pile_index]
+    if pile_index not in TABLEAUS:
+        return slot_count - 1 if on_card(x, y, mat_x, mat_y) else None
+    # cards fan downwards, so the lowest card reaching the point is the one on top, unless the point
+    # is in that card's cut off corner and the card above it shows through
+    # (starting a card lower, as on a top edge the division can round down past it)
+    slot = min(slot_count - 1, int((mat_y - y + CARD_HEIGHT / 2) // CARD_VERTICAL_OFFSET) + 1)
+    while slot >= 0 and y > mat_y - CARD_VERTICAL_OFFSET * slot - CARD_HEIGHT / 2:
+        if on_card(x, y, mat_x, mat_y - CARD_VERTICAL_OFFSET * slot):
+            return slot
+        slot -= 1
+    return None
+
+
+def hit_test(x, y, piles):
+    # what is under a point, as (pile, slot) for a card, (pile, None) for an empty bit of mat,
+    # or None for the table, piles only has to give the number of cards in each pile
+    column = round((x - START_X) / X_SPACING)
+    if not 0 <= column < len(TABLEAUS):
+        return None
+    # at most one pile per row can be under a column
+    candidates = []
+    if column < len(FOUNDATIONS):
+        candidates.append(FOUNDATION_1 + column)
+    candidates.append(TABLEAU_1 + column)
+    if column <= TALON - STOCK:
+        candidates.append(STOCK + column)
+    # cards sit on top of mats, and a long tableau pile can hang over the stock and talon
+    for pile_index in candidates:
+        slot = card_at(pile_index, len(piles[pile_index]), x, y)
+        if slot is not None:
+            return pile_index, slot
+    for pile_index in candidates:
+        if in_box(x, y, *PILE_POSITIONS[pile_index], MAT_WIDTH, MAT_HEIGHT):
+            return pile_index, None
+    return None
+
+
+def nearest_pile(x, y, piles):
+    # the pile whose top card (or mat, if empty) is closest to a point
+    def distance(pile_index):
+        top_x, top_y = card_position(pile_index, max(0, len(piles[pile_index]) - 1))
+        return (top_x - x) ** 2 + (top_y - y) ** 2
+    return min(range(PILE_COUNT), key=distance)
+
+
+def drop_target(x, y, piles):
+    # the pile a card dropped with its centre here lands on, or None if it is over nothing
+    # a card is over a pile when it overlaps the pile's mat or the fanned cards below it
+    pile_index = nearest_pile(x, y, piles)
+    mat_x, mat_y = PILE_POSITIONS[pile_index]
+    bottom = mat_y - MAT_HEIGHT / 2
+    if pile_index in TABLEAUS and len(piles[pile_index]) > 0:
+        bottom = min(bottom, mat_y - CARD_VERTICAL_OFFSET * (len(piles[pile_index]) - 1) - CARD_HEIGHT / 2)
+    if (abs(x - mat_x) < (MAT_WIDTH + CARD_WIDTH) / 2
+            and y - CARD_HEIGHT / 2 < mat_y + MAT_HEIGHT / 2 and y + CARD_HEIGHT / 2 > bottom):
+        return pile_index
+    return None
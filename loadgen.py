@@ -0,0 +1,150 @@
+# load generator for the game server
+# opens many connections that each deal a batch of games and play them all at once, a random
+# legal move (or now and then an undo) in each game in turn, until every game is won, stuck or
+# out of moves; prints round trip latency percentiles per op, and the server's own, as JSON
+# --serve runs a server in this process on a free port, so it can be tried with nothing else running
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+import server as game_server
+
+# connections, and games each one plays at once
+CLIENTS = 50
+GAMES = 20
+# a game is left after this many moves
+MAX_MOVES = 100
+# chance of an undo instead of a move
+UNDO_CHANCE = 0.05
+
+
+class Client:
+    # one connection, sending a request and waiting for its reply
+    def __init__(self, reader, writer, samples):
+        self.reader = reader
+        self.writer = writer
+        # op -> round trip seconds, shared by every client
+        self.samples = samples
+        self.next_id = 0
+
+    async def request(self, op, **fields):
+        # the reply to a request, raises RuntimeError if the server turned it down
+        self.next_id += 1
+        line = json.dumps({"id": self.next_id, "op": op, **fields}, separators=(",", ":")).encode() + b"\n"
+        started = time.perf_counter()
+        self.writer.write(line)
+        reply = json.loads(await self.reader.readline())
+        self.samples[op].append(time.perf_counter() - started)
+        if not reply["ok"] or reply["id"] != self.next_id:
+            raise RuntimeError(f"{op} failed: {reply}")
+        return reply
+
+
+async def connect(host, port, unix):
+    if unix:
+        return await asyncio.open_unix_connection(unix)
+    return await asyncio.open_connection(host, port)
+
+
+async def play(address, games, seed, samples, results):
+    # one connection's games, dealt together and played a move at a time in turn
+    reader, writer = await connect(*address)
+    client = Client(reader, writer, samples)
+    rng = random.Random(seed)
+    sessions = [(await client.request("deal", deal=rng.randrange(1000000)))["session"] for _ in range(games)]
+    made = dict.fromkeys(sessions, 0)
+    for _ in range(MAX_MOVES):
+        for session in list(made):
+            if made[session] and rng.random() < UNDO_CHANCE:
+                await client.request("undo", session=session)
+                made[session] -= 1
+                continue
+            moves = (await client.request("moves", session=session))["moves"]
+            won = False
+            if moves:
+                won = (await client.request("move", session=session, move=rng.choice(moves)))["won"]
+                made[session] += 1
+            if won or not moves:
+                results["won" if won else "stuck"] += 1
+                await client.request("close", session=session)
+                del made[session]
+        if not made:
+            break
+    for session in made:
+        await client.request("close", session=session)
+    results["unfinished"] += len(made)
+    writer.close()
+    await writer.wait_closed()
+
+
+def summary(samples):
+    # percentiles of an op's round trip times, in microseconds
+    times = np.array(samples) * 1e6
+    p50, p90, p99 = (round(float(value), 1) for value in np.percentile(times, (50, 90, 99)))
+    return {"n": len(times), "p50_us": p50, "p90_us": p90, "p99_us": p99, "max_us": round(float(times.max()), 1)}
+
+
+async def run(args):
+    hosted = None
+    address = (args.host, args.port, args.unix)
+    if args.serve:
+        hosted = await game_server.Server().start(args.host, 0, args.unix)
+        if not args.unix:
+            address = (args.host, hosted.sockets[0].getsockname()[1], None)
+    samples = defaultdict(list)
+    results = dict.fromkeys(("won", "stuck", "unfinished"), 0)
+    started = time.perf_counter()
+    await asyncio.gather(*(play(address, args.games, args.seed + index, samples, results)
+                           for index in range(args.clients)))
+    seconds = time.perf_counter() - started
+    # the server's own view of how long requests took, without the network
+    reader, writer = await connect(*address)
+    server_stats = await Client(reader, writer, defaultdict(list)).request("stats")
+    writer.close()
+    await writer.wait_closed()
+    if hosted is not None:
+        hosted.close()
+        await hosted.wait_closed()
+    requests = sum(len(times) for times in samples.values())
+    return {
+        "clients": args.clients,
+        "games": args.clients * args.games,
+        **results,
+        "seconds": round(seconds, 2),
+        "requests_per_second": round(requests / seconds),
+        "round_trip": {op: summary(times) for op, times in samples.items()},
+        "server": {op: stats for op, stats in server_stats["ops"].items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many games against the game server and time the requests.")
+    parser.add_argument("--clients", type=int, default=CLIENTS, help="connections")
+    parser.add_argument("--games", type=int, default=GAMES, help="games each connection plays at once")
+    parser.add_argument("--seed", type=int, default=0, help="seed for deals and moves")
+    parser.add_argument("--host", default=game_server.HOST, help="server address")
+    parser.add_argument("--port", type=int, default=game_server.PORT, help="server TCP port")
+    parser.add_argument("--unix", default=None, metavar="PATH", help="connect to a unix socket instead")
+    parser.add_argument("--serve", action="store_true", help="run a server in this process to test against")
+    parser.add_argument("--out", default=None, help="write the JSON here as well as printing it")
+    args = parser.parse_args()
+
+    try:
+        results = asyncio.run(run(args))
+    except (ConnectionError, RuntimeError) as error:
+        sys.exit(f"load test failed: {error}")
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as out:
+            out.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,107 +1,113 @@
+import argparse
+import os
+import time
+from collections import deque
+
 import arcade
-import random
+import numpy as np
+
+import animation
+import deals
+import instrument
+from clock import GameClock
+import klondike
+import layout
+import savegame
+import solver
+import winchance
+import winnable
+from klondike import (
+    CARD_COUNT, CARD_VALUES, CARD_SUITS, PILE_COUNT, STOCK, TALON, TABLEAUS, FOUNDATIONS, Move, DRAW, RECYCLE,
+    FLIP, MOVE
+)
+from layout import (
+    SCREEN_WIDTH, SCREEN_HEIGHT, CARD_SCALE, MAT_WIDTH, MAT_HEIGHT, BOTTOM_Y, TOP_Y, MIDDLE_Y, PILE_POSITIONS
+)
+from textures import CardTextures
 
-# screen parameters
-SCREEN_WIDTH = 1024
-SCREEN_HEIGHT = 768
 SCREEN_TITLE = "Click and Drag"
 
-# test
-# card parameters
-# Scaling component of card sizes
-CARD_SCALE = 0.6
-
-# ratio component of card sizes
-CARD_WIDTH = 140 * CARD_SCALE
-CARD_HEIGHT = 190 * CARD_SCALE
-
-# how big is each mat (spot to put a card on)
-MAT_PERCENT_OVERSIZE = 1.25
-MAT_WIDTH = int(CARD_WIDTH * MAT_PERCENT_OVERSIZE)
-MAT_HEIGHT = int(CARD_HEIGHT * MAT_PERCENT_OVERSIZE)
-
-# how far apart are mats as a percentage of mat size?
-VERTICAL_MARGIN_PERCENT = 0.10
-HORIZONTAL_MARGIN_PERCENT = 0.10
-
-# how far up should the stockpile and talon be?
-BOTTOM_Y = MAT_HEIGHT / 2 + MAT_HEIGHT * VERTICAL_MARGIN_PERCENT
-
-# How far from the left should the first stack be?
-START_X = MAT_WIDTH/2 + MAT_WIDTH*HORIZONTAL_MARGIN_PERCENT
-
-# enums for card values and suits
-CARD_VALUES = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
-CARD_SUITS = ["Clubs", "Hearts", "Spades", "Diamonds"]
-
-# face down image
-FACE_DOWN_IMAGE = "venv/Lib/site-packages/arcade/resources/images/cards/cardBack_red2.png"
-# FACE_DOWN_IMAGE = ":resources:images/cards/cardBack_red2.png"
-
-# how far from the top should the foundations be?
-TOP_Y = SCREEN_HEIGHT - MAT_HEIGHT/2 - MAT_HEIGHT*VERTICAL_MARGIN_PERCENT
-
-# how far from the top should the tableau be?
-MIDDLE_Y = TOP_Y - MAT_HEIGHT - MAT_HEIGHT*VERTICAL_MARGIN_PERCENT
-
-# how far apart should each mat be?
-X_SPACING = MAT_WIDTH + MAT_WIDTH*HORIZONTAL_MARGIN_PERCENT
-
-# How far apart should stacked tableau cards be?
-CARD_VERTICAL_OFFSET = CARD_HEIGHT * CARD_SCALE * 0.3
-
-# pile indexes
-PILE_COUNT = 13
-STOCK = 0
-TALON = 1
-TABLEAU_1 = 2
-TABLEAU_2 = 3
-TABLEAU_3 = 4
-TABLEAU_4 = 5
-TABLEAU_5 = 6
-TABLEAU_6 = 7
-TABLEAU_7 = 8
-FOUNDATION_1 = 9
-FOUNDATION_2 = 10
-FOUNDATION_3 = 11
-FOUNDATION_4 = 12
+# check the layout hit tests against sprite collisions, printing any disagreement
+DEBUG_HIT_TEST = False
+
+# order the pile layers are drawn in, long tableau piles can hang over the stock and talon
+LAYER_ORDER = (STOCK, TALON, *FOUNDATIONS, *TABLEAUS)
+
+# power save mode (--power-save), for leaving the game open for hours
+# after this many seconds without input the game updates IDLE_UPDATE_RATE seconds apart
+IDLE_SECONDS = 5
+ACTIVE_UPDATE_RATE = 1 / 60
+IDLE_UPDATE_RATE = 1 / 4
+# frames drawn after something on screen changes, one for each buffer
+REDRAW_FRAMES = 2
+
+# two left clicks this close together in time (seconds) and space (pixels) are a double click
+DOUBLE_CLICK_SECONDS = 0.4
+DOUBLE_CLICK_DISTANCE = 5
+
+# hint outline
+HINT_COLOR = arcade.color.YELLOW
+HINT_BORDER_WIDTH = 4
+
+# solver result text, right of the tableau
+SOLVER_TEXT_X = SCREEN_WIDTH - 105
+# budget for the S key's search, which runs in a worker process while play carries on
+SOLVE_NODES = 1000000
+SOLVE_SECONDS = 10.0
 
 # standard(3) or Vegas(1)
-GAME_RULE = 3
+GAME_RULE = klondike.STANDARD
 
 # keep track of vegas score between games
 VEGAS_SCORE = 0
 
+
 class Card(arcade.Sprite):
-    def __init__(self, value, suit, scale):
-        self.suit = suit
-        self.value = value
+    def __init__(self, card_id, scale, textures):
+        # what the card is, shared with the rules engine
+        self.info = klondike.CARDS[card_id]
 
-        self.image_file_name = f"venv/Lib/site-packages/arcade/resources/images/cards/card{self.suit}{self.value}.png"
-        # self.image_file_name = f":resources:images/cards/card{self.suit}{self.value}.png"
+        # shared textures, flipping just swaps which one is shown
+        self.face_texture = textures.face(self.info.value, self.info.suit_name)
+        self.back_texture = textures.back
         self.is_face_up = False
 
-        super().__init__(FACE_DOWN_IMAGE, scale, hit_box_algorithm="None")
+        # which pile the card is in, and its slot in that pile
+        # kept up to date by Game.move_cards_to_pile
+        self.pile = None
+        self.slot = None
+
+        super().__init__(scale=scale, hit_box_algorithm="None", texture=self.back_texture)
 
     def face_down(self):
         self.is_face_up = False
-        self.texture = arcade.load_texture(FACE_DOWN_IMAGE)
+        self.texture = self.back_texture
 
     def face_up(self):
         self.is_face_up = True
-        self.texture = arcade.load_texture(self.image_file_name)
+        self.texture = self.face_texture
 
     def is_face_down(self):
         return not self.is_face_up
 
 
 class Game(arcade.Window):
-    def __init__(self):
+    def __init__(self, power_save=False, history_limit=klondike.HISTORY_LIMIT, save_path=None, win_chance=False,
+                 winnable_only=False, instruments=False, counters_path=None):
         # add startup stuff here
         super().__init__(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE)
         arcade.set_background_color(arcade.color.AQUAMARINE)  # can change background color here
-        # timer stuff here
-        self.total_time = 0.0
+        # with instruments on, count every texture load, starting with the cards'
+        if instruments:
+            instrument.count_texture_loads()
+        # load all card textures once, reused by every setup()
+        self.textures = CardTextures(CARD_VALUES, CARD_SUITS)
+        # timer stuff here, game time runs in fixed ticks whatever the frame rate
+        self.clock = None
+        # whole seconds the timer text shows
+        self.shown_time = None
+        # score or win text need rebuilding
+        self.hud_dirty = True
         self.timer_text = arcade.Text(
             text="00:00",
             start_x=SCREEN_WIDTH * 3 // 4,
@@ -110,7 +116,6 @@ class Game(arcade.Window):
             font_size=70,
             anchor_x="center",
         )
-        self.score = 0
         self.score_text = arcade.Text(
             text="0",
             start_x=SCREEN_WIDTH * 3 // 4,
@@ -130,158 +135,385 @@ class Game(arcade.Window):
             anchor_x="center",
         )
 
-        # sprite list of all cards
-        self.card_list = None
+        # live win chance, under the score
+        self.win_chance_text = arcade.Text(
+            text="",
+            start_x=SCREEN_WIDTH * 3 // 4,
+            start_y=BOTTOM_Y - MAT_HEIGHT // 3,
+            color=arcade.color.BLACK,
+            font_size=14,
+            anchor_x="center",
+        )
+        # background playouts for it, if turned on
+        self.win_chance = winchance.WinChance() if win_chance else None
+
+        # the S key's search, its worker started the first time it is used
+        self.solver = None
+        # result of the last solver run on this position
+        self.solver_text = arcade.Text(
+            text="",
+            start_x=SOLVER_TEXT_X,
+            start_y=MIDDLE_Y,
+            color=arcade.color.BLACK,
+            font_size=14,
+            anchor_x="center",
+        )
+
+        # rules engine state, the sprites below just show it
+        self.state = None
+        # deal being played, setup(deal_id) plays it again
+        self.deal_id = None
+        # and its card order
+        self.order = None
+        # card sprites, indexed by card number
+        self.cards = None
         # sprite list of mats
         self.pile_mat_list = None
         # list of piles, each being a list of cards
         self.piles = None
+        # sprite list per pile giving the draw order, and one for cards in hand drawn on top
+        self.layers = None
+        self.held_layer = None
+        # cards on their way to a pile, drawn from a layer of their own
+        self.moving_layer = None
+        self.animation = None
+        # piles whose layers are out of date, brought up to date once per frame
+        self.dirty_layers = set()
 
         # list of cards being dragged
         self.held_cards = None
-        # and where they were taken from (in case they have to revert)
-        self.held_cards_original_position = None
+        # where they were taken from, as an n x 2 array, and how far they have been dragged
+        # the sprites stay where they were taken from, only the held layer is drawn dragged
+        self.held_start = None
+        self.held_offset = None
+        # their slots in the held layer
+        self.held_slots = None
+
+        # legal moves, kept up to date as moves are made
+        self.moves = None
+        # moves that can be undone and redone, at most history_limit of them
+        self.history_limit = history_limit
+        self.history = None
+        # every move from the deal to the current position, for saving the game
+        self.log = []
+        # the stock has been turned all the way through, so the player knows its order (kept
+        # through undo, what was seen stays seen)
+        self.stock_seen = False
+        # score before the first move, the Vegas total carried in
+        self.start_score = 0
+        # new games only come from the winnable deal index, if turned on
+        self.winnable = winnable.WinnableDeals() if winnable_only else None
+        # finished games are added to this saved game archive
+        self.save_path = save_path
+        # where the game being played starts in that archive, if it was loaded from there, so
+        # saving it again writes over its earlier copy rather than adding it a second time
+        self.save_offset = None
+        # saved moves still to replay, and seconds between them
+        self.replay_moves = deque()
+        self.replay_interval = 0.0
+        self.replay_time = 0.0
+        # move suggested by the hint key, if showing
+        self.hint = None
+        # time and place of the last left click, to spot double clicks
+        self.last_click = None
+
+        # power save mode only draws when something changes, and slows down when idle
+        self.power_save = power_save
+        # frames still to draw before the screen is up to date
+        self.redraw_frames = REDRAW_FRAMES
+        # seconds since the last input, and whether updates have been slowed down
+        self.idle_time = 0.0
+        self.throttled = False
+        # counters to check what power save mode saves
+        self.frames_drawn = 0
+        self.cpu_start = time.process_time()
+        # whether the last on_draw drew anything, nothing new is shown if it didn't
+        self.drew_frame = True
+        # running totals for the instrumentation, sprite list appends and pops, and hit tests
+        self.layer_changes = 0
+        self.hit_tests = 0
+
+        # sprites are built once, setup() only rearranges them
+        self.build_sprites()
+
+        # handler timing, overlay and profiling, if turned on (after everything it wraps exists)
+        self.instruments = instrument.Instruments(self, counters_path) if instruments else None
+
+    def build_sprites(self):
+        # one time construction of the mats, pile sprite lists and card sprites
+        # declare foundations, tableau, stock and talon
+        self.pile_mat_list = arcade.SpriteList()
+        self.layers = [self.textures.sprite_list() for _ in range(PILE_COUNT)]
+        self.held_layer = self.textures.sprite_list()
+        self.moving_layer = self.textures.sprite_list()
+        self.animation = animation.Animation(self.moving_layer)
+        # stock, talon, tableau and foundations, in pile order
+        for position in PILE_POSITIONS:
+            pile = arcade.SpriteSolidColor(MAT_WIDTH, MAT_HEIGHT, arcade.csscolor.BLUE)
+            pile.position = position
+            self.pile_mat_list.append(pile)
+
+        # declare card sprites, indexed by card number
+        self.cards = [Card(card_id, CARD_SCALE, self.textures) for card_id in range(CARD_COUNT)]
+
+    @property
+    def score(self):
+        # the score lives in the rules engine state
+        return self.state.score
+
+    @score.setter
+    def score(self, value):
+        self.state.score = value
+        self.hud_dirty = True
 
     # DONE: Display winning screen
     def winner(self):
         # set up the win screen
-        minutes = int(self.total_time) // 60
-        seconds = int(self.total_time) % 60
+        self.clock.stop()
         # check if standard rule
-        if GAME_RULE == 3:
-            self.score += 700000 / ((minutes * 60) + seconds)
+        if self.state.rule == klondike.STANDARD:
+            self.score += klondike.win_bonus(self.clock.seconds)
         self.win = "YOU WIN!"
+        self.hud_dirty = True
 
-    def setup(self):
+    def setup(self, deal_id=None, order=None):
         # set up initial game, or restart game
+        # a deal id replays that exact layout, otherwise a new one is picked
+        # order deals an exact card layout instead, from a saved game
+        # keep the game being left
+        if self.state is not None:
+            self.archive_game()
+        self.land_cards()
         # reset timer
-
-
         self.win = ""
-        self.total_time = 0.0
+        self.shown_time = None
+        self.hud_dirty = True
+        self.redraw()
         # reset score for standard rules
-        if GAME_RULE == 3:
-            self.score = 0
-
-        # vegas rules starts at -52
-        if GAME_RULE == 1:
-            self.score = VEGAS_SCORE
-
-
-        # declare foundations, tableau, stock and talon
-        self.pile_mat_list = arcade.SpriteList()
-        self.piles = [arcade.SpriteList() for _ in range(PILE_COUNT)]
-        # stock
-        pile = arcade.SpriteSolidColor(MAT_WIDTH, MAT_HEIGHT, arcade.csscolor.BLUE)
-        pile.position = START_X, BOTTOM_Y
-        self.pile_mat_list.append(pile)
-        # talon
-        pile = arcade.SpriteSolidColor(MAT_WIDTH, MAT_HEIGHT, arcade.csscolor.BLUE)
-        pile.position = START_X + X_SPACING, BOTTOM_Y
-        self.pile_mat_list.append(pile)
-        # tableau
-        for i in range(7):
-            pile = arcade.SpriteSolidColor(MAT_WIDTH, MAT_HEIGHT, arcade.csscolor.BLUE)
-            pile.position = START_X + i * X_SPACING, MIDDLE_Y
-            self.pile_mat_list.append(pile)
-        # foundations
-        for i in range(4):
-            pile = arcade.SpriteSolidColor(MAT_WIDTH, MAT_HEIGHT, arcade.csscolor.BLUE)
-            pile.position = START_X + i * X_SPACING, TOP_Y
-            self.pile_mat_list.append(pile)
+        if GAME_RULE == klondike.STANDARD:
+            score = 0
 
-        # declare and populate card list
-        self.card_list = arcade.SpriteList()
-        for suit in CARD_SUITS:
-            for value in CARD_VALUES:
-                card = Card(value, suit, CARD_SCALE)
-                card.position = START_X, BOTTOM_Y  # put all cards at bottom left for now
-                self.card_list.append(card)
+        # vegas rules carry the score between games
+        if GAME_RULE == klondike.VEGAS:
+            score = VEGAS_SCORE
 
-        # shuffle cards
-        for pos1 in range(len(self.card_list)):
-            pos2 = random.randrange(len(self.card_list))
-            self.card_list.swap(pos1, pos2)
+        # shuffle cards, showing the deal id so the game can be replayed
+        if order is not None:
+            deal_id = None
+            self.set_caption(f"{SCREEN_TITLE} - saved layout")
+        else:
+            if deal_id is None and self.winnable is not None:
+                deal_id = self.winnable.random_deal_id(GAME_RULE)
+            # any deal if there is no index for these rules
+            if deal_id is None:
+                deal_id = deals.random_deal_id()
+            if not 0 <= deal_id <= deals.MAX_DEAL_ID:
+                raise ValueError(f"deal id {deal_id} isn't in 0..{deals.MAX_DEAL_ID}")
+            order = deals.deal(deal_id)
+            self.set_caption(f"{SCREEN_TITLE} - deal {deal_id}")
+        self.deal_id = deal_id
+        self.order = order
+
+        # deal in the rules engine
+        self.state = klondike.deal(order, GAME_RULE, score)
+        self.start_score = score
+        self.log = []
+        self.stock_seen = False
+        self.save_offset = None
+        self.replay_moves.clear()
+        self.clock = GameClock(GAME_RULE)
+        self.moves = klondike.MoveGenerator(self.state)
+        self.history = klondike.History(self.history_limit)
+        if self.win_chance is not None:
+            self.win_chance.set_position(self.state, self.stock_seen)
+        self.hint = None
+        self.stop_solving()
+        self.last_click = None
 
         # declare cards on mouse
         self.held_cards = []
-        self.held_cards_original_position = []
-
-        # place cards into stock to start
-        for card in self.card_list:
-            self.piles[STOCK].append(card)
-
-        # pull from stock to deal
-        for pile_no in range(TABLEAU_1, TABLEAU_7 + 1):
-            for j in range(pile_no - TABLEAU_1 + 1):
-                card = self.piles[STOCK].pop()
-                self.piles[pile_no].append(card)
-                # spread out cards
-                if j == 0:
-                    card.position = self.pile_mat_list[pile_no].position
-                else:
-                    top_card = self.piles[pile_no][-2]
-                    card.position = top_card.center_x, top_card.center_y - CARD_VERTICAL_OFFSET
-                self.pull_to_top(card)
 
-        # flip top cards of tableau face up
-        for pile_no in range(TABLEAU_1, TABLEAU_7 + 1):
-            self.piles[pile_no][-1].face_up()
+        # lay the pooled cards out the way the engine dealt them
+        self.piles = [[] for _ in range(PILE_COUNT)]
+        for pile_index, pile in enumerate(self.state.piles):
+            for card_id in pile:
+                card = self.cards[card_id]
+                card.pile = pile_index
+                card.slot = len(self.piles[pile_index])
+                self.piles[pile_index].append(card)
+                self.place_card(card)
+                if self.state.is_face_up(pile_index, card.slot):
+                    card.face_up()
+                else:
+                    card.face_down()
+        # the layers catch up on the next draw, keeping their buffers
+        self.dirty_layers.update(range(PILE_COUNT))
+        # deal the tableau out from the stock, along the rows
+        dealt = sorted((card for pile_index in TABLEAUS for card in self.piles[pile_index]),
+                       key=lambda card: (card.slot, card.pile))
+        self.animate(dealt, [PILE_POSITIONS[STOCK]] * len(dealt),
+                     [index * animation.DEAL_STAGGER for index in range(len(dealt))])
 
     def on_draw(self):
         # overrides the on_draw from arcade to render the screen
+        # in power save mode the last frame stays up until something changes
+        self.drew_frame = not self.power_save or self.redraw_frames > 0
+        if not self.drew_frame:
+            return
+        self.redraw_frames = max(0, self.redraw_frames - 1)
+        self.frames_drawn += 1
         # clear the screen
         self.clear()
         # draw the mats
         self.pile_mat_list.draw()
-        # draw the cards
-        self.card_list.draw()
+        # draw the cards, pile by pile, then any on the move, with any in hand on top
+        self.update_layers()
+        for pile_index in LAYER_ORDER:
+            self.layers[pile_index].draw()
+        self.moving_layer.draw()
+        if self.held_cards:
+            animation.write_positions(self.held_layer, self.held_slots, self.held_start + self.held_offset)
+        self.held_layer.draw()
         # draw the timer text
         self.timer_text.draw()
         # draw the score text
         self.score_text.draw()
         # draw the win text
         self.win_text.draw()
+        # draw the win chance
+        self.win_chance_text.draw()
+        # draw the solver result
+        self.solver_text.draw()
+        # draw the hint
+        if self.hint is not None:
+            self.draw_hint()
 
     def on_update(self, delta_time):
-        # accumulate time
-        if self.win != "YOU WIN!":
-            self.total_time += delta_time
-            # alter the timer text
-            minutes = int(self.total_time) // 60
-            seconds = int(self.total_time) % 60
-
-            # is this standard rules?
-            if GAME_RULE == 3:
-                if seconds % 10 == 0 and seconds != 0:
-                    self.score -= (2/60)
-
+        # accumulate time, the clock works out the standard rules time penalty
+        penalty = self.clock.advance(delta_time)
+        if penalty:
+            self.score += penalty
+
+        # alter the timer text once a second
+        if self.clock.seconds != self.shown_time:
+            self.shown_time = self.clock.seconds
+            minutes, seconds = divmod(self.shown_time, 60)
             self.timer_text.text = f"{minutes:02d}:{seconds:02d}"
-        self.score_text.text = f"{round(self.score)}"
-        self.win_text.text = f"{self.win}"
-
-        # DONE: check if victory
-        if len(self.piles[9]) != 0 and len(self.piles[10]) != 0 and len(self.piles[11]) != 0 and len(self.piles[12]) != 0:
-            if self.piles[9][-1].value == "K" and self.piles[10][-1].value == "K" and self.piles[11][-1].value == "K" and self.piles[12][-1].value == "K":
-                if self.win != "YOU WIN!":
-                    self.winner()
-
+            self.redraw()
+
+        if self.replay_moves:
+            self.replay_step(delta_time)
+
+        # move any flying cards on
+        if self.animation.cards:
+            if self.animation.step(delta_time):
+                self.land_cards()
+            self.redraw()
+
+        if self.win_chance is not None:
+            self.update_win_chance()
+
+        if self.solver is not None:
+            self.update_solver()
+
+        if self.hud_dirty:
+            self.update_hud()
+
+        # slow down once nobody has touched the game for a while, and nothing is replaying or moving
+        self.idle_time += delta_time
+        if (self.power_save and not self.throttled and self.idle_time >= IDLE_SECONDS and not self.held_cards
+                and not self.replay_moves and not self.animation.cards):
+            self.throttled = True
+            self.set_update_rate(IDLE_UPDATE_RATE)
+
+    def flip(self):
+        # nothing was drawn, keep showing the last frame
+        if self.drew_frame:
+            super().flip()
+
+    def redraw(self):
+        # something on screen changed, draw it on the next frames
+        self.redraw_frames = REDRAW_FRAMES
+
+    def wake(self):
+        # input came in, go back to full speed
+        self.idle_time = 0.0
+        if self.throttled:
+            self.throttled = False
+            self.set_update_rate(ACTIVE_UPDATE_RATE)
+
+    def cpu_time(self):
+        # processor seconds used since the window opened
+        return time.process_time() - self.cpu_start
+
+    def on_resize(self, width, height):
+        super().on_resize(width, height)
+        self.redraw()
+
+    def on_show(self):
+        self.redraw()
+
+    def on_expose(self):
+        self.redraw()
+
+    def on_close(self):
+        self.archive_game()
+        if self.win_chance is not None:
+            self.win_chance.close()
+        if self.solver is not None:
+            self.solver.close()
+        if self.power_save:
+            print(f"{self.frames_drawn} frames drawn, {self.cpu_time():.1f}s cpu")
+        super().on_close()
+
+    def update_win_chance(self):
+        # show the latest playout results, never waiting for them
+        totals = self.win_chance.poll()
+        text = ""
+        if totals is not None and totals[1] > 0:
+            text = f"win chance {totals[0] / totals[1]:.0%}"
+        if self.win_chance_text.text != text:
+            self.win_chance_text.text = text
+            self.redraw()
+
+    def update_hud(self):
+        # rebuild the score and win text, only when what they show has changed
+        # setting the text of an arcade.Text lays out all its glyphs again
+        self.hud_dirty = False
+        self.redraw()
+        score = f"{round(self.score)}"
+        if self.score_text.text != score:
+            self.score_text.text = score
+        win = f"{self.win}"
+        if self.win_text.text != win:
+            self.win_text.text = win
 
     def on_mouse_press(self, x, y, button, key_modifiers):
-        # get list of cards at point where we clicked
-        cards = arcade.get_sprites_at_point((x, y), self.card_list)
-
-        # check if there were any
-        if len(cards) > 0:
-
-            # get top card of stack
-            primary_card = cards[-1]
-            pile_index = self.get_pile_for_card(primary_card)
+        self.wake()
+        self.redraw()
+        # hands off while a saved game replays, and once the game is won
+        if self.replay_moves or self.win == "YOU WIN!":
+            return
+        self.land_cards()
+        # find the card or mat under the click from the layout
+        hit = layout.hit_test(x, y, self.state.piles)
+        self.hit_tests += 1
+        if DEBUG_HIT_TEST:
+            self.check_hit_test(x, y, hit)
+        # a double click anywhere but the stock sends every card it can up to the foundations
+        if (button == arcade.MOUSE_BUTTON_LEFT and self.is_double_click(x, y)
+                and (hit is None or hit[0] != STOCK)):
+            self.send_to_foundations()
+            return
+        if hit is None:
+            return
+        pile_index, slot = hit
 
+        # check if a card was clicked
+        if slot is not None:
 
             # get top card of stack
-            primary_card = cards[-1]
-            pile_index = self.get_pile_for_card(primary_card)
+            primary_card = self.piles[pile_index][slot]
 
             # DONE: add checking for right-click, and try to find a spot for that card in foundation, tableau
             if pile_index != STOCK and button == arcade.MOUSE_BUTTON_RIGHT:
@@ -289,326 +521,478 @@ class Game(arcade.Window):
                 return
 
             if pile_index == STOCK:
-                for i in range(GAME_RULE):
-                    if len(self.piles[STOCK]) == 0:
-                        break
-                    card = self.piles[STOCK][-1]
-                    card.face_up()
-                    card.position = self.pile_mat_list[TALON].position
-                    self.piles[STOCK].remove(card)
-                    self.piles[TALON].append(card)
-                    self.pull_to_top(card)
+                # turn cards over onto the talon
+                self.play(klondike.stock_move(self.state))
                 return
             # flip if face down
-            elif primary_card.is_face_down() and primary_card == self.piles[pile_index][-1]:
-                primary_card.face_up()
-            # add primary card to hand
-            self.held_cards = [primary_card]
-            # save its position
-            self.held_cards_original_position = [self.held_cards[0].position]
-            # and pull it to the top of the rendering order
-            self.pull_to_top(self.held_cards[0])
-
-            # is it a stack?
-            card_index = self.piles[pile_index].index(primary_card)
-            for i in range(card_index+1, len(self.piles[pile_index])):
-                card = self.piles[pile_index][i]
-                self.held_cards.append(card)
-                self.held_cards_original_position.append(card.position)
-                self.pull_to_top(card)
-
+            elif primary_card.is_face_down() and self.is_top_card(primary_card):
+                self.play(Move(FLIP, pile_index, pile_index, 0))
+            # face down cards can't be picked up
+            if primary_card.is_face_down():
+                return
+            # add primary card to hand, with any cards on top of it
+            self.held_cards = self.piles[pile_index][primary_card.slot:]
+            # save their positions
+            self.held_start = np.array([card.position for card in self.held_cards], dtype=np.float32)
+            self.held_offset = np.zeros(2, dtype=np.float32)
+            # and move them to the held layer, drawn on top of every pile
+            self.dirty_layers.add(pile_index)
+
+        # if it is an empty stock mat, turn the talon over (standard rules only)
+        elif pile_index == STOCK:
+            move = klondike.stock_move(self.state)
+            if move is not None and move.kind == RECYCLE:
+                self.play(move)
+
+    def is_double_click(self, x, y):
+        # note a left click, is it the second of a double click?
+        now = time.monotonic()
+        last = self.last_click
+        self.last_click = now, x, y
+        if last is None or now - last[0] > DOUBLE_CLICK_SECONDS:
+            return False
+        if abs(x - last[1]) > DOUBLE_CLICK_DISTANCE or abs(y - last[2]) > DOUBLE_CLICK_DISTANCE:
+            return False
+        # a third click starts a new double click
+        self.last_click = None
+        return True
+
+    def check_hit_test(self, x, y, hit):
+        # debug only, what the sprite collision scan finds under the click
+        cards = []
+        for pile_index in LAYER_ORDER:
+            cards += arcade.get_sprites_at_point((x, y), self.layers[pile_index])
+        if len(cards) > 0:
+            expected = cards[-1].pile, cards[-1].slot
         else:
-            # clicked on a mat?
             mats = arcade.get_sprites_at_point((x, y), self.pile_mat_list)
-            if len(mats) > 0:
-                mat = mats[0]
-                mat_index = self.pile_mat_list.index(mat)
-                # if it is an empty stock mat and standard rules
-                if GAME_RULE == 3:
-                    if mat_index == STOCK and len(self.piles[STOCK]) == 0:
-                        self.score -= 20
-                        temp_list = []
-                        for card in self.piles[TALON]:
-                            temp_list.append(card)
-                        for card in reversed(temp_list):
-                            card.face_down()
-                            self.piles[TALON].remove(card)
-                            self.piles[STOCK].append(card)
-                            card.position = self.pile_mat_list[STOCK].position
+            expected = (self.pile_mat_list.index(mats[0]), None) if len(mats) > 0 else None
+        if hit != expected:
+            print(f"hit test at ({x}, {y}) gave {hit}, sprites gave {expected}")
 
     def move_card(self, card):
-        global VEGAS_SCORE
-
-        # get card's current pile
-        curr_pile = self.get_pile_for_card(card)
-        # check if card is not on top
-        if self.piles[curr_pile][-1] != card:
-            return
-        # check if face down and flip if it is
-        if not card.is_face_up:
-            card.face_up()
-            # check if standard rule
-            if GAME_RULE == 3:
-                self.score += 5
+        # right click, flip the card or send it to the first pile that takes it
+        if not self.is_top_card(card):
             return
-        for i in range(FOUNDATION_4, TABLEAU_1 - 1, -1):
-            # checking foundation
-            if i > 8:
-                # if ace
-                if card.value == "A":
-                    if len(self.piles[i]) == 0:
-                        card.set_position(self.pile_mat_list[i].center_x, self.pile_mat_list[i].center_y)
-                        self.pull_to_top(card)
-                        self.piles[i].append(card)
-                        self.piles[curr_pile].remove(card)
-                        # check if standard rule
-                        if GAME_RULE == 3:
-                            self.score += 10
-                        # check if vegas rules
-                        if GAME_RULE == 1:
-                            self.score += 5
-                            VEGAS_SCORE += 5
-                            return VEGAS_SCORE
-                        return
-                    else:
-                        continue
-                if len(self.piles[i]) == 0:
-                    continue
-                # what are the values of the pile and held cards?
-                for valueIndex, value in enumerate(CARD_VALUES):
-                    if value == card.value:
-                        card_value = valueIndex
-                    if value == self.piles[i][len(self.piles[i])-1].value:
-                        top_value = valueIndex
-                # if not ace
-                if top_value == card_value - 1 and self.piles[i][-1].suit == card.suit:
-                    card.set_position(self.piles[i][0].center_x, self.piles[i][0].center_y)
-                    self.pull_to_top(card)
-                    self.piles[i].append(card)
-                    self.piles[curr_pile].remove(card)
-                    # check if standard rule
-                    if GAME_RULE == 3:
-                        self.score += 10
-                    # check if vegas rules
-                    if GAME_RULE == 1:
-                        self.score += 5
-                        VEGAS_SCORE += 5
-                        return VEGAS_SCORE
-                    return
-            # checking tableau
-            else:
-                # if king
-                if card.value == "K":
-                    if len(self.piles[i]) == 0:
-                        card.set_position(self.pile_mat_list[i].center_x, self.pile_mat_list[i].center_y)
-                        self.pull_to_top(card)
-                        self.piles[i].append(card)
-                        self.piles[curr_pile].remove(card)
-                        # check if standard rule
-                        if GAME_RULE == 3:
-                            self.score += 5
-                        return
-                    else:
-                        continue
-                if len(self.piles[i]) == 0:
-                    continue
-                # what are the values of the pile and held cards?
-                for valueIndex, value in enumerate(CARD_VALUES):
-                    if value == card.value:
-                        card_value = valueIndex
-                    if value == self.piles[i][len(self.piles[i])-1].value:
-                        top_value = valueIndex
-                # are the cards black or red?
-                if card.suit == "Spades" or card.suit == "Clubs":
-                    card_color = "Black"
-                else:
-                    card_color = "Red"
-                # is the pile card black or red?
-                if self.piles[i][len(self.piles[i]) - 1].suit == "Spades" or self.piles[i][len(self.piles[i])-1].suit == "Clubs":
-                    top_color = "Black"
-                else:
-                    top_color = "Red"
-                # if not king
-                if card_value == top_value - 1 and card_color != top_color:
-                    card.set_position(self.piles[i][0].center_x, self.piles[i][0].center_y - (len(self.piles[i]))*CARD_VERTICAL_OFFSET)
-                    self.pull_to_top(card)
-                    self.piles[i].append(card)
-                    self.piles[curr_pile].remove(card)
-                    # check if standard rule
-                    if GAME_RULE == 3:
-                        self.score += 5
-                    return
+        move = klondike.auto_move(self.state, card.pile)
+        if move is not None:
+            self.play(move)
 
     def on_mouse_release(self, x, y, button, key_modifiers):
+        self.wake()
 
         # if no cards held, do nothing
         if len(self.held_cards) == 0:
             return
+        self.redraw()
+
+        # put the held cards where they were dragged to
+        for card, position in zip(self.held_cards, (self.held_start + self.held_offset).tolist()):
+            card.position = tuple(position)
 
-        # find the closest card to held card, and its pile
+        # find the pile under the held card from the layout
         # DONE: alter to drop to pile by dropping on stack as well (currently only drops on mat)
-        pile, distance = arcade.get_closest_sprite(self.held_cards[0], self.pile_mat_list)
+        pile_index = layout.drop_target(self.held_cards[0].center_x, self.held_cards[0].center_y,
+                                        self.state.piles)
+        self.hit_tests += 1
+        if DEBUG_HIT_TEST:
+            self.check_drop_target(pile_index)
         reset_position = True
 
-        # check for collision
-        if len(arcade.check_for_collision_with_lists(self.held_cards[0], (self.card_list, self.pile_mat_list))) > 0:
-            # which pile?
-            pile_index = self.pile_mat_list.index(pile)
-            # is it its old pile?
-            if pile_index == self.get_pile_for_card(self.held_cards[0]):
-                # just return it to its old position
-                pass
-
-            # is it on a tableau pile?
-            elif TABLEAU_1 <= pile_index <= TABLEAU_7:
-                # are there other cards there?
-                if len(self.piles[pile_index]) > 0:
-                    # DONE: add validity checking here for tableau stacking
-                    # what is the top card of the pile?
-                    top_card = self.piles[pile_index][len(self.piles[pile_index])-1]
-                    held_value = 0
-                    top_value = 0
-
-                    # what are the values of the pile and held cards?
-                    for valueIndex, value in enumerate(CARD_VALUES):
-                        if value == self.held_cards[0].value:
-                            held_value = valueIndex
-                        if value == top_card.value:
-                            top_value = valueIndex
-
-                    # is the held card black or red?
-                    if self.held_cards[0].suit == "Spades" or self.held_cards[0].suit == "Clubs":
-                        held_color = "Black"
-                    else:
-                        held_color = "Red"
-                    # is the pile card black or red?
-                    if top_card.suit == "Spades" or top_card.suit == "Clubs":
-                        top_color = "Black"
-                    else:
-                        top_color = "Red"
-
-                    # is the pile card one value higher than the held card?
-                    if top_value - 1 == held_value:
-                        # is the pile card a different color than the held card?
-                        if held_color != top_color:
-
-                            # move card to proper position
-                            for i, dropped_card in enumerate(self.held_cards):
-                                dropped_card.position = top_card.center_x, top_card.center_y - CARD_VERTICAL_OFFSET * (1+i)
-                                reset_position = False
-                            for card in self.held_cards:
-                                self.move_card_to_pile(card, pile_index)
-                                # check if standard rule
-                                if GAME_RULE == 3:
-                                    self.score += 5 / len(self.held_cards)
+        if pile_index is not None:
+            # can the held cards go there? (never true for their own pile)
+            move = Move(MOVE, self.held_cards[0].pile, pile_index, len(self.held_cards))
+            if self.moves.is_legal(move):
+                self.play(move)
+                reset_position = False
 
-                else:
-                    # is the held card a king?
-                    # DONE: add checking for kings
-                    if self.held_cards[0].value == 'K':
-                        for i, dropped_card in enumerate(self.held_cards):
-                            dropped_card.position = pile.center_x, pile.center_y - CARD_VERTICAL_OFFSET * i
-                            reset_position = False
-                        for card in self.held_cards:
-                            self.move_card_to_pile(card, pile_index)
-                            # check if standard rule
-                            if GAME_RULE == 3:
-                                self.score += 5 / len(self.held_cards)
-
-            # is it on a foundation pile, and is it only 1 card?
-            elif FOUNDATION_1 <= pile_index <= FOUNDATION_4 and len(self.held_cards) == 1:
-
-                # are there other cards there?
-                if len(self.piles[pile_index]) > 0:
-
-                    # what is the top card of the pile?
-                    top_card = self.piles[pile_index][len(self.piles[pile_index]) - 1]
-                    held_value = 0
-                    top_value = 0
-
-                    # what are the values of the pile and held cards?
-                    for valueIndex, value in enumerate(CARD_VALUES):
-                        if value == self.held_cards[0].value:
-                            held_value = valueIndex
-                        if value == top_card.value:
-                            top_value = valueIndex
-
-                    # is the pile card one value lower than the held card?
-                    if top_value + 1 == held_value:
-                        # is the pile card the same suit as the held card?
-                        if self.held_cards[0].suit == top_card.suit:
-                            self.held_cards[0].position = pile.position
-                            self.move_card_to_pile(self.held_cards[0], pile_index)
-                            # check if standard rule
-                            if GAME_RULE == 3:
-                                self.score += 10
-                            reset_position = False
-                else:
-                    # is the held card an A?
-                    # DONE: add validity checking here for foundation (Ace and stacking)
-                    if self.held_cards[0].value == 'A':
-                        self.held_cards[0].position = pile.position
-                        self.move_card_to_pile(self.held_cards[0], pile_index)
-                        # check if standard rule
-                        if GAME_RULE == 3:
-                            self.score += 10
-                        reset_position = False
-
-        # for invalid drops
+        # for invalid drops, fly the cards back
         if reset_position:
-            for pile_index, card in enumerate(self.held_cards):
-                card.position = self.held_cards_original_position[pile_index]
+            starts = [card.position for card in self.held_cards]
+            for card in self.held_cards:
+                self.place_card(card)
+            self.animate(self.held_cards, starts)
 
         # cards are no longer in hand
+        self.dirty_layers.add(self.held_cards[0].pile)
         self.held_cards = []
 
+    def check_drop_target(self, pile_index):
+        # debug only, the closest mat as long as the held card touches anything
+        pile, distance = arcade.get_closest_sprite(self.held_cards[0], self.pile_mat_list)
+        expected = None
+        if len(arcade.check_for_collision_with_lists(self.held_cards[0], self.layers + [self.pile_mat_list])) > 0:
+            expected = self.pile_mat_list.index(pile)
+        if pile_index != expected:
+            print(f"drop target {pile_index}, sprites gave {expected}")
+
     def on_mouse_motion(self, x, y, dx, dy):
+        self.wake()
         # if holding a card, move card with mouse
-        for card in self.held_cards:
-            card.center_x += dx
-            card.center_y += dy
-
-    def pull_to_top(self, card: arcade.Sprite):
-        # make selected card render at top
-        self.card_list.remove(card)
-        self.card_list.append(card)
-
-    def get_pile_for_card(self, card):
-        # get which pile the given card is in
-        for index, pile in enumerate(self.piles):
-            if card in pile:
-                return index
-
-    def remove_card_from_pile(self, card):
-        for pile in self.piles:
-            if card in pile:
-                pile.remove(card)
-                break
-
-    def move_card_to_pile(self, card, pile_index):
-        self.remove_card_from_pile(card)
-        self.piles[pile_index].append(card)
+        if self.held_cards:
+            self.held_offset += (dx, dy)
+            self.redraw()
+
+    def update_layers(self):
+        # bring the draw order up to date, once per frame and only for piles that changed
+        if not self.dirty_layers:
+            return
+        held_pile = self.held_cards[0].pile if self.held_cards else None
+        for pile_index in self.dirty_layers:
+            cards = self.piles[pile_index]
+            if pile_index == held_pile:
+                cards = cards[:self.held_cards[0].slot]
+            # cards still flying to the top of the pile are drawn by the animation until they land
+            end = len(cards)
+            while end > 0 and cards[end - 1] in self.animation.flying:
+                end -= 1
+            self.layer_changes += self.update_layer(self.layers[pile_index], cards[:end])
+        self.layer_changes += self.update_layer(self.held_layer, self.held_cards)
+        self.held_slots = animation.layer_slots(self.held_layer, self.held_cards)
+        self.dirty_layers.clear()
+
+    @staticmethod
+    def update_layer(layer, cards):
+        # make a sprite list hold cards, in order
+        # piles only change at the top, so this only pops and appends at the end of the list
+        # returns how many pops and appends that took
+        keep = 0
+        while keep < len(layer) and keep < len(cards) and layer[keep] is cards[keep]:
+            keep += 1
+        changes = len(layer) - keep + len(cards) - keep
+        while len(layer) > keep:
+            layer.pop()
+        for card in cards[keep:]:
+            layer.append(card)
+        return changes
+
+    def is_top_card(self, card):
+        # is the given card on top of its pile?
+        return card.slot == len(self.piles[card.pile]) - 1
+
+    def place_card(self, card):
+        # put a card where its pile and slot say it belongs
+        card.position = layout.card_position(card.pile, card.slot)
+
+    def apply_move(self, move):
+        # apply a legal move in the rules engine, then bring the sprites in line with it
+        self.apply_moves([move])
+
+    def apply_moves(self, moves, stagger=0.0):
+        # apply legal moves one after another as a batch, with the score and win check done once
+        # for the lot, each move's cards setting off stagger seconds after the one before
+        self.land_cards()
+        total = 0
+        for index, move in enumerate(moves):
+            score = self.moves.apply(move)
+            self.history.record(move, score)
+            self.log.append(move)
+            if move.kind == RECYCLE:
+                self.stock_seen = True
+            total += score
+            self.show_move(move, delay=index * stagger)
+        self.moved(total)
+        # DONE: check if victory, which can only happen as a card lands on a foundation
+        if any(move.kind == MOVE and move.dst in FOUNDATIONS for move in moves):
+            if klondike.is_won(self.state) and self.win != "YOU WIN!":
+                self.winner()
+
+    def play(self, move):
+        # a move the player made, which finishes the game off once it can't be lost
+        self.apply_move(move)
+        if self.win != "YOU WIN!" and klondike.can_auto_complete(self.state):
+            self.apply_moves(klondike.foundation_moves(self.state), animation.SEND_STAGGER)
+
+    def send_to_foundations(self):
+        # send every card that can go up onto the foundations, turning over cards on the way
+        moves = klondike.foundation_moves(self.state)
+        if moves:
+            self.apply_moves(moves, animation.SEND_STAGGER)
+
+    def undo(self):
+        # take back the last move, not once the game is won or while cards are held
+        if self.win == "YOU WIN!" or self.held_cards:
+            return
+        delta = self.history.undo()
+        if delta is None:
+            return
+        self.land_cards()
+        self.moves.undo(delta.move)
+        self.log.pop()
+        self.moved(-delta.score)
+        self.show_move(delta.move, undo=True)
+
+    def redo(self):
+        # make the last undone move again, which may be the one that wins
+        if self.win == "YOU WIN!" or self.held_cards:
+            return
+        delta = self.history.redo()
+        if delta is None:
+            return
+        self.land_cards()
+        self.moves.apply(delta.move)
+        self.log.append(delta.move)
+        self.moved(delta.score)
+        self.show_move(delta.move)
+        if klondike.is_won(self.state):
+            self.winner()
+
+    def moved(self, score):
+        # the position changed by a move, or by taking one back
+        global VEGAS_SCORE
+        self.hud_dirty = True
+        self.hint = None
+        self.stop_solving()
+        # vegas winnings carry over to the next game
+        if self.state.rule == klondike.VEGAS:
+            VEGAS_SCORE += score
+        # playouts of the old position are no use now
+        if self.win_chance is not None:
+            self.win_chance.set_position(self.state, self.stock_seen)
+
+    def show_move(self, move, undo=False, delay=0.0):
+        # bring the sprites in line with a move the engine just made, or just took back
+        # its cards set off delay seconds from now
+        kind, src, dst, count = move
+        if undo:
+            src, dst = dst, src
+        if kind == FLIP:
+            if undo:
+                self.piles[src][-1].face_down()
+            else:
+                self.piles[src][-1].face_up()
+            return
+        if kind == MOVE:
+            cards = self.piles[src][-count:]
+            self.move_cards_to_pile(cards, dst)
+            starts = [card.position for card in cards]
+        else:
+            # draws and recycles turn the cards over one at a time,
+            # face up onto the talon and face down onto the stock
+            cards = []
+            for _ in range(count):
+                card = self.piles[src][-1]
+                self.move_cards_to_pile([card], dst)
+                if dst == TALON:
+                    card.face_up()
+                else:
+                    card.face_down()
+                cards.append(card)
+            starts = [card.position for card in cards]
+        for card in cards:
+            self.place_card(card)
+        self.animate(cards, starts, [delay] * len(cards))
+
+    def animate(self, cards, starts, delays=None):
+        # show cards, already in their places, flying there from starts
+        self.animation.add(cards, starts, delays)
+        self.dirty_layers.update(card.pile for card in cards)
+        self.redraw()
+
+    def land_cards(self):
+        # put any flying cards straight down, before the piles change again
+        for card in self.animation.finish():
+            self.dirty_layers.add(card.pile)
+
+    def move_cards_to_pile(self, cards, pile_index):
+        # move cards (the top of their pile, bottom card first) onto another pile
+        # every move between piles goes through here to keep card.pile and card.slot right
+        src_pile = self.piles[cards[0].pile]
+        for _ in cards:
+            src_pile.pop()
+        dst_pile = self.piles[pile_index]
+        self.dirty_layers.update((cards[0].pile, pile_index))
+        for card in cards:
+            card.pile = pile_index
+            card.slot = len(dst_pile)
+            dst_pile.append(card)
+
+    def draw_hint(self):
+        # outline the card(s) the hint would move and where they would go
+        kind, src, dst, count = self.hint
+        if kind == DRAW or kind == RECYCLE:
+            hinted = [self.pile_mat_list[STOCK]]
+        elif kind == FLIP:
+            hinted = [self.piles[src][-1]]
+        else:
+            hinted = [self.piles[src][-count]]
+            if len(self.piles[dst]) > 0:
+                hinted.append(self.piles[dst][-1])
+            else:
+                hinted.append(self.pile_mat_list[dst])
+        for sprite in hinted:
+            arcade.draw_rectangle_outline(sprite.center_x, sprite.center_y, sprite.width, sprite.height,
+                                          HINT_COLOR, HINT_BORDER_WIDTH)
+
+    def saved_game(self):
+        # the game so far, as a savegame.SavedGame
+        return savegame.SavedGame(
+            self.state.rule, self.deal_id, None if self.deal_id is not None else self.order, self.start_score,
+            self.clock.ticks, self.score, [savegame.encode_move(move) for move in self.log],
+        )
+
+    def archive_game(self):
+        # add the current game to the save file, if there is one and a move was made
+        # a replay left part way through is still whole in the file it came from, so it isn't saved
+        if self.save_path and self.log and not self.replay_moves:
+            savegame.append(self.save_path, self.saved_game(), self.save_offset)
+            self.save_offset = None
+            self.log = []
+
+    def restore(self, saved, speed=None, save_offset=None):
+        # carry on from a saved game, its moves made at once, or speed moves a second to watch them
+        # save_offset is where the game starts in the save file, if it came from there
+        # raises ValueError if the saved moves don't replay
+        global GAME_RULE
+        global VEGAS_SCORE
+        savegame.replay(saved)
+        GAME_RULE = saved.rule
+        if saved.rule == klondike.VEGAS:
+            VEGAS_SCORE = saved.start_score
+        self.setup(saved.deal_id, saved.order)
+        self.save_offset = save_offset
+        self.score = self.start_score = saved.start_score
+        # the clock already took its penalty for the saved time
+        self.clock.ticks = saved.ticks
+        if saved.rule == klondike.STANDARD:
+            self.score -= klondike.time_penalty(self.clock.seconds)
+        moves = [savegame.decode_move(code) for code in saved.moves]
+        if speed is None:
+            # the position is laid out at once, nothing flies
+            self.apply_moves(moves)
+            self.land_cards()
+            return
+        # the clock waits for the replay to finish
+        self.clock.running = False
+        self.replay_moves.extend(moves)
+        self.replay_interval = 1 / speed
+        self.replay_time = 0.0
+
+    def replay_step(self, delta_time):
+        # make the replay moves that are due
+        self.replay_time += delta_time
+        while self.replay_moves and self.replay_time >= self.replay_interval:
+            self.replay_time -= self.replay_interval
+            self.apply_move(self.replay_moves.popleft())
+        # carry on playing from where the replay ends
+        if not self.replay_moves:
+            self.clock.running = self.win != "YOU WIN!"
+
+    def solve(self):
+        # start the solver on the current position in the background, update_solver() shows how
+        # it went; positions that need a longer search than the budget come back unknown
+        # the search can't settle most Vegas draw 1 positions within the budget (see the
+        # README), so S only searches standard games
+        if self.state.rule == klondike.VEGAS:
+            self.solver_text.text = "draw 3 only"
+            return
+        if self.solver is None:
+            self.solver = solver.BackgroundSolver()
+        self.solver.start(self.state, SOLVE_NODES, SOLVE_SECONDS)
+        self.solver_text.text = "solving..."
+
+    def update_solver(self):
+        # show the search's result once it is done, never waiting for it
+        result = self.solver.poll()
+        if result is None:
+            return
+        if result.status == solver.SOLVABLE:
+            self.solver_text.text = f"win in {len(result.moves)}"
+            print("winning line: " + ", ".join(solver.describe(move) for move in result.moves))
+        else:
+            self.solver_text.text = result.status
+        self.redraw()
+
+    def stop_solving(self):
+        # the position changed, so a search of the old one and its result are no use
+        if self.solver is not None:
+            self.solver.cancel()
+        if self.solver_text.text:
+            self.solver_text.text = ""
 
     def on_key_press(self, symbol: int, modifiers: int):
         global GAME_RULE
         global VEGAS_SCORE
+        self.wake()
+        self.redraw()
+        # only a new game stops a replay
+        if self.replay_moves and symbol not in (arcade.key.R, arcade.key.V):
+            return
         # let player reset with r
         if symbol == arcade.key.R:
-            GAME_RULE = 3
+            GAME_RULE = klondike.STANDARD
             VEGAS_SCORE = 0
             self.setup()
             return GAME_RULE, VEGAS_SCORE
+        # show the best move with h
+        if symbol == arcade.key.H:
+            self.hint = self.moves.best()
+            return
+        # undo with z, redo with y
+        if symbol == arcade.key.Z:
+            self.undo()
+            return
+        if symbol == arcade.key.Y:
+            self.redo()
+            return
+        # check whether the current position can still be won with s
+        if symbol == arcade.key.S:
+            self.solve()
+            return
         # DONE: let the player play vegas rules with v
         if symbol == arcade.key.V:
-            GAME_RULE = 1
-            VEGAS_SCORE -= 52
+            GAME_RULE = klondike.VEGAS
+            VEGAS_SCORE += klondike.VEGAS_BUY_IN
             self.setup()
             return GAME_RULE, VEGAS_SCORE
 
 
+def deal_id_arg(text):
+    # a --deal value, which has to be a deal id that can be dealt and saved
+    if not text.isdecimal() or int(text) > deals.MAX_DEAL_ID:
+        raise argparse.ArgumentTypeError(f"deal ids are whole numbers from 0 to {deals.MAX_DEAL_ID}")
+    return int(text)
+
+
 def main():
-    window = Game()
-    window.setup()
+    parser = argparse.ArgumentParser(description="Klondike solitaire.")
+    parser.add_argument("--deal", type=deal_id_arg, default=None, help="deal id to play, from the window title")
+    parser.add_argument("--power-save", action="store_true",
+                        help="only redraw when something changes and slow down when nobody is playing")
+    parser.add_argument("--history", type=int, default=klondike.HISTORY_LIMIT,
+                        help="most moves that can be undone")
+    parser.add_argument("--save", default=None, metavar="FILE", help="add every game played to this file")
+    parser.add_argument("--load", default=None, metavar="FILE", help="carry on from the last game in this file")
+    parser.add_argument("--replay", default=None, metavar="FILE", help="watch the last game in this file")
+    parser.add_argument("--speed", type=float, default=4.0, help="replay speed, in moves per second")
+    parser.add_argument("--winnable", action="store_true",
+                        help="only deal games the solver has won, from the index built by winnable.py")
+    parser.add_argument("--win-chance", action="store_true",
+                        help="show the chance of winning from the current position, worked out in the background")
+    parser.add_argument("--instrument", action="store_true",
+                        help="time the event handlers, F3 shows the times and F4 starts and stops profiling")
+    parser.add_argument("--counters", default=None, metavar="FILE",
+                        help="with --instrument, write counters once a second to this .csv or .json file on exit")
+    args = parser.parse_args()
+
+    saved = save_offset = None
+    load_path = args.load or args.replay
+    if load_path:
+        with open(load_path, "rb") as archive:
+            last = savegame.load_last(archive.read())
+        if last is None:
+            raise SystemExit("no saved games in that file")
+        saved, offset = last
+        # a game carried on in the file it came from is saved over its old copy
+        if args.save and os.path.exists(args.save) and os.path.samefile(load_path, args.save):
+            save_offset = offset
+
+    window = Game(args.power_save, args.history, args.save, args.win_chance, args.winnable, args.instrument,
+                  args.counters)
+    if saved is None:
+        window.setup(args.deal)
+    else:
+        window.restore(saved, args.speed if args.replay else None, save_offset)
     arcade.run()
 
 
@@ -0,0 +1,152 @@
+# saved games
+# a game is stored as its deal and the moves made, a few hundred bytes, and replaying the moves
+# gives back the exact position and score, so archived games can be checked in bulk
+import argparse
+import struct
+import sys
+import time
+from array import array
+from collections import namedtuple
+
+import deals
+import klondike
+from clock import TICKS_PER_SECOND
+
+MAGIC = b"KLS1"
+# magic, rule, flags, deal id, starting score, clock ticks, final score, number of moves, 34 bytes
+HEADER = struct.Struct("<4sBBIdIdI")
+# flags
+HAS_LAYOUT = 1    # the 52 card layout follows the header instead of a deal id
+
+# rule(3) or Vegas(1), deal id or card order (the other is None), score before the first move
+# (the Vegas total carried in), game clock ticks, score when saved, moves as 16 bit codes
+SavedGame = namedtuple("SavedGame", "rule deal_id order start_score ticks score moves")
+
+
+def encode_move(move):
+    # a move as 16 bits: kind 2, src 4, dst 4, count 6
+    kind, src, dst, count = move
+    return kind | src << 2 | dst << 6 | count << 10
+
+
+def decode_move(code):
+    return klondike.Move(code & 3, code >> 2 & 15, code >> 6 & 15, code >> 10)
+
+
+def dumps(saved):
+    # a saved game as bytes
+    flags = HAS_LAYOUT if saved.order is not None else 0
+    header = HEADER.pack(MAGIC, saved.rule, flags, saved.deal_id or 0, saved.start_score, saved.ticks,
+                         saved.score, len(saved.moves))
+    moves = array("H", saved.moves)
+    if sys.byteorder == "big":
+        moves.byteswap()
+    layout = bytes(saved.order) if flags & HAS_LAYOUT else b""
+    return header + layout + moves.tobytes()
+
+
+def loads(data, offset=0):
+    # a saved game from bytes, returns (SavedGame, offset just past it)
+    magic, rule, flags, deal_id, start_score, ticks, score, count = HEADER.unpack_from(data, offset)
+    if magic != MAGIC:
+        raise ValueError("not a saved game")
+    offset += HEADER.size
+    order = None
+    if flags & HAS_LAYOUT:
+        order = bytes(data[offset:offset + klondike.CARD_COUNT])
+        offset += klondike.CARD_COUNT
+        deal_id = None
+    moves = array("H")
+    moves.frombytes(data[offset:offset + 2 * count])
+    if sys.byteorder == "big":
+        moves.byteswap()
+    offset += 2 * count
+    return SavedGame(rule, deal_id, order, start_score, ticks, score, moves), offset
+
+
+def load_all(data):
+    # every saved game in an archive of saved games written one after another
+    offset = 0
+    while offset < len(data):
+        saved, offset = loads(data, offset)
+        yield saved
+
+
+def load_last(data):
+    # the last game in an archive and the offset it starts at, or None if there are no games
+    last = None
+    offset = 0
+    while offset < len(data):
+        start = offset
+        saved, offset = loads(data, offset)
+        last = saved, start
+    return last
+
+
+def append(path, saved, offset=None):
+    # add a saved game to the end of an archive file
+    # with an offset the archive is cut back to it first, so the game replaces the one saved there
+    with open(path, "ab" if offset is None else "r+b") as archive:
+        if offset is not None:
+            archive.truncate(offset)
+            archive.seek(offset)
+        archive.write(dumps(saved))
+
+
+def starting_state(saved):
+    # the position before the first move
+    order = saved.order if saved.order is not None else deals.deal(saved.deal_id)
+    return klondike.deal(order, saved.rule, saved.start_score)
+
+
+def replay(saved):
+    # re-apply a saved game's moves headless, returns the final State, score included
+    # raises ValueError if a move isn't legal where it was made
+    state = starting_state(saved)
+    won = False
+    for code in saved.moves:
+        move = decode_move(code)
+        if not klondike.is_legal(state, move):
+            raise ValueError(f"illegal move {move}")
+        klondike.apply_move(state, move)
+        won = won or klondike.is_won(state)
+    # the game clock takes its penalty as it runs and stops when the game is won, the bonus going
+    # in then, so it stands even if an older game went on to move cards back off the foundations
+    seconds = saved.ticks // TICKS_PER_SECOND
+    if saved.rule == klondike.STANDARD:
+        state.score -= klondike.time_penalty(seconds)
+        if won:
+            state.score += klondike.win_bonus(seconds)
+    return state
+
+
+def verify(saved):
+    # does replaying the moves give the saved score?
+    try:
+        return replay(saved).score == saved.score
+    except ValueError:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that saved games replay to their saved scores.")
+    parser.add_argument("archives", nargs="+", help="saved game files, each holding any number of games")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    games = failed = 0
+    for path in args.archives:
+        with open(path, "rb") as archive:
+            data = archive.read()
+        for index, saved in enumerate(load_all(data)):
+            games += 1
+            if not verify(saved):
+                failed += 1
+                print(f"{path} game {index}: deal {saved.deal_id}, saved score {saved.score} doesn't replay")
+    print(f"{games} games, {failed} failed, {time.perf_counter() - started:.2f}s")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+# headless game server
+# hosts any number of games in one asyncio loop, no window needed, for tournaments, bots and
+# remote clients; clients connect over local TCP or a unix socket and send one JSON request per
+# line, each answered by one JSON line
+#
+# requests, each with an optional "id" that is sent back with the reply:
+#   {"op": "deal", "deal": 123, "rule": "standard"}     new game, deal and rule optional
+#   {"op": "state", "session": 1}                        the piles, face down counts and score
+#   {"op": "moves", "session": 1}                        the legal moves
+#   {"op": "move", "session": 1, "move": [3, 7, 9, 1]}   make a move, [kind, src, dst, count]
+#   {"op": "undo", "session": 1}                         take back the last move
+#   {"op": "close", "session": 1}                        end a game
+#   {"op": "stats"}                                      sessions, requests and latency percentiles
+# replies have "ok": true, or "ok": false and an "error"
+# cards are numbered as in klondike.CARDS and piles as in klondike (STOCK, TALON, tableaus,
+# foundations); there is no game clock, so standard rules games have no time penalty or win bonus
+import argparse
+import asyncio
+import json
+import os
+import time
+from array import array
+from collections import defaultdict, deque
+
+import numpy as np
+
+import deals
+import klondike
+import savegame
+
+RULES = {"standard": klondike.STANDARD, "vegas": klondike.VEGAS}
+RULE_NAMES = {rule: name for name, rule in RULES.items()}
+
+HOST = "127.0.0.1"
+PORT = 8334
+# most games open at once
+MAX_SESSIONS = 100000
+# request times kept per op for the stats
+LATENCY_SAMPLES = 10000
+# longest request line accepted
+MAX_LINE = 4096
+# moves dropped from the front of a game's undo history at a time once it is over the limit, so
+# the history isn't shifted along on every move
+HISTORY_TRIM = 64
+
+
+class Session:
+    # one game, kept small: the position packed into 81 bytes, and the moves that can be undone
+    # as 16 bit codes (the same as saved games use)
+    __slots__ = ("deal_id", "packed", "history")
+
+    def __init__(self, deal_id, state):
+        self.deal_id = deal_id
+        self.packed = state.pack()
+        self.history = array("H")
+
+
+class RequestError(Exception):
+    # a bad request, sent back to the client as the error
+    pass
+
+
+def state_json(state):
+    return {
+        "rule": RULE_NAMES[state.rule],
+        "piles": [list(pile) for pile in state.piles],
+        "down": list(state.down),
+        "score": state.score,
+        "won": klondike.is_won(state),
+    }
+
+
+class Server:
+    def __init__(self, history_limit=klondike.HISTORY_LIMIT):
+        self.history_limit = history_limit
+        self.sessions = {}
+        self.next_session = 1
+        self.requests = 0
+        # op -> seconds taken by its latest requests
+        self.latencies = defaultdict(lambda: deque(maxlen=LATENCY_SAMPLES))
+        self.ops = {
+            "deal": self.deal,
+            "state": self.state,
+            "moves": self.moves,
+            "move": self.move,
+            "undo": self.undo,
+            "close": self.close,
+            "stats": self.stats,
+        }
+
+    def session(self, request):
+        # the session a request is for, and its position
+        try:
+            session = self.sessions[request["session"]]
+        except (KeyError, TypeError):
+            raise RequestError("no such session")
+        return session, klondike.State.unpack(session.packed)
+
+    def deal(self, request):
+        if len(self.sessions) >= MAX_SESSIONS:
+            raise RequestError("too many sessions")
+        rule = request.get("rule", "standard")
+        rule = RULES.get(rule) if isinstance(rule, str) else None
+        if rule is None:
+            raise RequestError("rule must be standard or vegas")
+        deal_id = request.get("deal")
+        if deal_id is None:
+            deal_id = deals.random_deal_id()
+        if type(deal_id) is not int or not 0 <= deal_id < 2 ** 32:
+            raise RequestError("deal must be a 32 bit deal id")
+        state = klondike.deal(deals.deal(deal_id), rule)
+        session_id = self.next_session
+        self.next_session += 1
+        self.sessions[session_id] = Session(deal_id, state)
+        return {"session": session_id, "deal": deal_id, "state": state_json(state)}
+
+    def state(self, request):
+        session, state = self.session(request)
+        return {"deal": session.deal_id, "state": state_json(state)}
+
+    def moves(self, request):
+        _, state = self.session(request)
+        return {"moves": [list(move) for move in klondike.legal_moves(state)]}
+
+    def move(self, request):
+        session, state = self.session(request)
+        fields = request.get("move")
+        if type(fields) is not list or len(fields) != 4 or any(type(field) is not int for field in fields):
+            raise RequestError("move must be [kind, src, dst, count]")
+        move = klondike.Move(*fields)
+        if not (0 <= move.kind <= klondike.MOVE and 0 <= move.src < klondike.PILE_COUNT
+                and 0 <= move.dst < klondike.PILE_COUNT and klondike.is_legal(state, move)):
+            raise RequestError("illegal move")
+        # recorded before the position changes, so a move that can't be recorded isn't made
+        session.history.append(savegame.encode_move(move))
+        score = klondike.apply_move(state, move)
+        session.packed = state.pack()
+        if len(session.history) >= self.history_limit + HISTORY_TRIM:
+            del session.history[:len(session.history) - self.history_limit]
+        return {"change": score, "score": state.score, "won": klondike.is_won(state)}
+
+    def undo(self, request):
+        session, state = self.session(request)
+        if not session.history:
+            raise RequestError("nothing to undo")
+        move = savegame.decode_move(session.history.pop())
+        score = klondike.undo_move(state, move)
+        session.packed = state.pack()
+        return {"move": list(move), "change": -score, "score": state.score}
+
+    def close(self, request):
+        self.session(request)
+        del self.sessions[request["session"]]
+        return {}
+
+    def stats(self, request):
+        ops = {}
+        for op, samples in self.latencies.items():
+            p50, p99 = np.percentile(np.array(samples), (50, 99)) * 1e6
+            ops[op] = {"n": len(samples), "p50_us": round(float(p50), 1), "p99_us": round(float(p99), 1)}
+        return {"sessions": len(self.sessions), "requests": self.requests, "ops": ops}
+
+    def handle(self, line):
+        # one request line, returns the reply as a dict
+        started = time.perf_counter()
+        request = {}
+        op = None
+        try:
+            parsed = json.loads(line)
+            if not isinstance(parsed, dict):
+                raise RequestError("request must be a JSON object")
+            request = parsed
+            op = request.get("op")
+            if not isinstance(op, str) or op not in self.ops:
+                raise RequestError(f"unknown op {op!r}")
+            reply = self.ops[op](request)
+            reply["ok"] = True
+        except RequestError as error:
+            reply = {"ok": False, "error": str(error)}
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            reply = {"ok": False, "error": "request isn't JSON"}
+        except Exception as error:
+            # a bug shouldn't take the connection, and every other game on it, down with it
+            reply = {"ok": False, "error": f"internal error: {error!r}"}
+        if "id" in request:
+            reply["id"] = request["id"]
+        self.requests += 1
+        if reply["ok"]:
+            self.latencies[op].append(time.perf_counter() - started)
+        return reply
+
+    async def serve_client(self, reader, writer):
+        # answer one connection's requests in order until it closes
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # longer than MAX_LINE, the connection can't be read past it
+                    writer.write(b'{"ok":false,"error":"request too long"}\n')
+                    break
+                if not line:
+                    break
+                writer.write(json.dumps(self.handle(line), separators=(",", ":")).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host=HOST, port=PORT, unix=None):
+        # start listening, returns the asyncio server
+        if unix:
+            return await asyncio.start_unix_server(self.serve_client, unix, limit=MAX_LINE)
+        return await asyncio.start_server(self.serve_client, host, port, limit=MAX_LINE)
+
+
+async def serve(host, port, unix):
+    server = await Server().start(host, port, unix)
+    print("listening on " + (unix or ", ".join(str(sock.getsockname()) for sock in server.sockets)))
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host many headless games over a local socket.")
+    parser.add_argument("--host", default=HOST, help="address to listen on")
+    parser.add_argument("--port", type=int, default=PORT, help="TCP port to listen on")
+    parser.add_argument("--unix", default=None, metavar="PATH", help="listen on a unix socket instead")
+    args = parser.parse_args()
+    if args.unix and os.path.exists(args.unix):
+        os.unlink(args.unix)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+# batch game simulator
+# plays many numbered deals with an automated policy across processes and reports win rate,
+# score and game length statistics, to tune the scoring constants in klondike
+import argparse
+import bisect
+import importlib
+import json
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import deals
+import klondike
+
+# a game stops after this many moves, or this many moves without getting anywhere
+MAX_MOVES = 1000
+STALL_MOVES = 50
+
+# games per task sent to a worker, big enough that sending results back costs little
+CHUNK_SIZE = 500
+
+# scores are counted in buckets this wide
+SCORE_BUCKET = 10
+
+# scoring constants that can be changed from the command line
+TUNABLE = (
+    "FOUNDATION_SCORE", "TABLEAU_SCORE", "FLIP_SCORE", "RECYCLE_SCORE", "VEGAS_FOUNDATION_SCORE",
+    "VEGAS_BUY_IN", "WIN_BONUS", "TIME_PENALTY", "TIME_PENALTY_SECONDS",
+)
+
+RULES = {"standard": klondike.STANDARD, "vegas": klondike.VEGAS}
+
+
+def random_policy(state, moves, rng):
+    # any legal move
+    return rng.choice(moves)
+
+
+def greedy_policy(state, moves, rng):
+    # the move the hint key would show, ties broken at random
+    return max(moves, key=lambda move: (klondike.move_priority(state, move), rng.random()))
+
+
+POLICIES = {"random": random_policy, "greedy": greedy_policy}
+
+
+def load_policy(name):
+    # a built in policy, or "module:function" for your own
+    if name in POLICIES:
+        return POLICIES[name]
+    module_name, _, function_name = name.partition(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+class Stats:
+    # totals for a batch of games, never one object per game, so any batch size fits in memory
+    def __init__(self):
+        self.games = 0
+        self.wins = 0
+        self.moves = 0
+        self.score_total = 0.0
+        # game counts by score bucket and by number of moves
+        self.scores = Counter()
+        self.move_counts = Counter()
+
+    def add(self, won, score, moves):
+        self.games += 1
+        self.wins += won
+        self.moves += moves
+        self.score_total += score
+        self.scores[int(score // SCORE_BUCKET) * SCORE_BUCKET] += 1
+        self.move_counts[moves] += 1
+
+    def merge(self, other):
+        self.games += other.games
+        self.wins += other.wins
+        self.moves += other.moves
+        self.score_total += other.score_total
+        self.scores.update(other.scores)
+        self.move_counts.update(other.move_counts)
+
+    def report(self):
+        games = max(1, self.games)
+        return {
+            "games": self.games,
+            "win_rate": self.wins / games,
+            "score_mean": self.score_total / games,
+            "score_percentiles": percentiles(self.scores),
+            "moves_mean": self.moves / games,
+            "moves_percentiles": percentiles(self.move_counts),
+        }
+
+
+def percentiles(counts, points=(10, 50, 90, 99)):
+    # percentiles of a value -> count histogram
+    values = sorted(counts)
+    totals = []
+    running = 0
+    for value in values:
+        running += counts[value]
+        totals.append(running)
+    result = {}
+    for point in points:
+        if not values:
+            result[f"p{point}"] = None
+            continue
+        index = bisect.bisect_left(totals, running * point / 100)
+        result[f"p{point}"] = values[min(index, len(values) - 1)]
+    return result
+
+
+def play_game(deal_id, order, rule, policy, seconds_per_move):
+    # play one deal to the end, returns (won, score, moves)
+    rng = random.Random(deal_id)
+    score = klondike.VEGAS_BUY_IN if rule == klondike.VEGAS else 0
+    state = klondike.deal(order, rule, score)
+    generator = klondike.MoveGenerator(state)
+    moves = 0
+    stalled = 0
+    # most cards ever on the foundations, and fewest face down or left to draw
+    best = (0, -klondike.CARD_COUNT, -klondike.CARD_COUNT)
+    while moves < MAX_MOVES and stalled < STALL_MOVES:
+        legal = generator.moves()
+        if not legal:
+            break
+        generator.apply(policy(state, legal, rng))
+        moves += 1
+        if klondike.is_won(state):
+            break
+        # shuffling cards back and forth never beats the best seen so far
+        now = (sum(len(state.piles[i]) for i in klondike.FOUNDATIONS), -sum(state.down),
+               -len(state.piles[klondike.STOCK]) - len(state.piles[klondike.TALON]))
+        if any(a > b for a, b in zip(now, best)):
+            best = tuple(max(a, b) for a, b in zip(now, best))
+            stalled = 0
+        else:
+            stalled += 1
+
+    won = klondike.is_won(state)
+    if rule == klondike.STANDARD:
+        seconds = int(moves * seconds_per_move)
+        state.score -= klondike.time_penalty(seconds)
+        if won:
+            state.score += klondike.win_bonus(seconds)
+    return won, state.score, moves
+
+
+def run_chunk(start, count, rule, policy_name, seconds_per_move):
+    # worker task, plays deals start .. start + count and sends back only the totals
+    policy = load_policy(policy_name)
+    stats = Stats()
+    for deal_id, order in enumerate(deals.deal_range(start, count).tolist(), start):
+        stats.add(*play_game(deal_id, order, rule, policy, seconds_per_move))
+    return stats
+
+
+def set_constants(overrides):
+    # worker initializer, applies --set scoring overrides
+    for name, value in overrides.items():
+        setattr(klondike, name, value)
+
+
+def simulate(games, rule, policy_name, seconds_per_move=2.0, first_deal=0, workers=None,
+             chunk_size=CHUNK_SIZE, overrides=None):
+    # play games deals over a process pool, returns the merged Stats
+    workers = workers or os.cpu_count() or 1
+    total = Stats()
+    chunks = ((start, min(chunk_size, first_deal + games - start))
+              for start in range(first_deal, first_deal + games, chunk_size))
+    with ProcessPoolExecutor(max_workers=workers, initializer=set_constants,
+                             initargs=(overrides or {},)) as pool:
+        # keep a couple of chunks queued per worker and merge results as they arrive
+        pending = set()
+        for start, count in chunks:
+            pending.add(pool.submit(run_chunk, start, count, rule, policy_name, seconds_per_move))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    total.merge(future.result())
+        for future in pending:
+            total.merge(future.result())
+    return total
+
+
+def parse_overrides(pairs):
+    overrides = {}
+    for pair in pairs:
+        name, _, value = pair.partition("=")
+        if name not in TUNABLE:
+            raise SystemExit(f"can't set {name}, choose from {', '.join(TUNABLE)}")
+        overrides[name] = float(value)
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many Klondike deals and report scoring statistics.")
+    parser.add_argument("--games", type=int, default=10000, help="number of deals per rule set")
+    parser.add_argument("--first-deal", type=int, default=0, help="first deal id")
+    parser.add_argument("--rules", default="standard,vegas", help="comma separated: standard, vegas")
+    parser.add_argument("--policy", default="greedy", help="greedy, random or module:function")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE, help="games per worker task")
+    parser.add_argument("--seconds-per-move", type=float, default=2.0,
+                        help="simulated thinking time, for the standard time penalty and win bonus")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a scoring constant, e.g. --set FOUNDATION_SCORE=15")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    overrides = parse_overrides(args.set)
+    results = {}
+    for name in args.rules.split(","):
+        started = time.perf_counter()
+        stats = simulate(args.games, RULES[name], args.policy, args.seconds_per_move, args.first_deal,
+                         args.workers, args.chunk, overrides)
+        results[name] = stats.report()
+        results[name]["seconds"] = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, report in results.items():
+        print(f"{name}: {report['games']} games in {report['seconds']:.1f}s, "
+              f"win rate {report['win_rate']:.2%}")
+        print(f"  score mean {report['score_mean']:.1f}, "
+              + ", ".join(f"{point} {value}" for point, value in report["score_percentiles"].items()))
+        print(f"  moves mean {report['moves_mean']:.1f}, "
+              + ", ".join(f"{point} {value}" for point, value in report["moves_percentiles"].items()))
+
+
+if __name__ == "__main__":
+    main()
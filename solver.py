@@ -0,0 +1,516 @@
+# klondike solver
+# depth first search over the rules engine with a transposition table, so it runs
+# headless, or from inside the game in a worker process (BackgroundSolver)
+import argparse
+import functools
+import multiprocessing
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import deals
+import klondike
+from klondike import (
+    CARD_COUNT, STOCK, TALON, TABLEAUS, FOUNDATIONS, FOUNDATION_1, RANK, SUIT, COLOR, DRAW,
+    RECYCLE, FLIP, MOVE
+)
+
+# search results
+SOLVABLE = "solvable"
+# every move the search keeps was tried, but it leaves out some moves that are rarely any use
+# (see ordered_moves), so this is not a proof that the deal can't be won
+NO_WIN = "no win found"
+UNKNOWN = "unknown"
+
+# default budgets, for the command line and offline tools; the game passes its own smaller ones
+MAX_NODES = 200000
+MAX_SECONDS = 1.0
+
+# the two cards that can go on each tableau card, one rank lower and the other colour
+NEEDS = [
+    tuple(suit * 13 + RANK[top] - 1 for suit in range(len(klondike.CARD_SUITS)) if suit % 2 != COLOR[top])
+    if RANK[top] > 0 else ()
+    for top in range(CARD_COUNT)
+]
+# and the two each card can go on, one rank higher and the other colour
+PARENTS = [
+    tuple(suit * 13 + RANK[card] + 1 for suit in range(len(klondike.CARD_SUITS)) if suit % 2 != COLOR[card])
+    if RANK[card] < klondike.KING else ()
+    for card in range(CARD_COUNT)
+]
+# piles only ever dug into from the top, by rule: the tableau, and the talon when the stock is
+# turned once; with recycling the talon goes back into the stock and comes round again
+DUG_PILES = {klondike.STANDARD: tuple(TABLEAUS), klondike.VEGAS: (*TABLEAUS, TALON)}
+
+# stock and talon layouts whose talon_cards() are remembered
+TALON_CACHE_SIZE = 4096
+
+# how often (in nodes) the clock is checked
+CLOCK_INTERVAL = 1024
+
+# status: SOLVABLE, NO_WIN or UNKNOWN (budget ran out, or the search was stopped)
+# moves: the winning line when solvable
+Result = namedtuple("Result", "status moves nodes seconds")
+
+# zobrist keys, one random number per (kind of pile, slot, card)
+# every tableau column has its own keys, face up and face down, since a card's column matters:
+# shared keys would hash a card moved between two columns at the same slot the same as before
+# foundations share theirs, a foundation only ever holds one suit in order, so its cards alone
+# say what it holds and the same foundations in a different order are only searched once
+KEY_STOCK = 0
+KEY_TALON = 1
+KEY_FOUNDATION = 2
+KEY_TABLEAU = 3
+KEY_FACE_DOWN = KEY_TABLEAU + len(TABLEAUS)
+KEY_KINDS = KEY_FACE_DOWN + len(TABLEAUS)
+PILE_KEYS = ([KEY_STOCK, KEY_TALON] + [KEY_TABLEAU + column for column in range(len(TABLEAUS))]
+             + [KEY_FOUNDATION] * len(FOUNDATIONS))
+# keys for face down cards, tableau columns only
+DOWN_KEYS = [KEY_FACE_DOWN + pile_index - TABLEAUS[0] if pile_index in TABLEAUS else None
+             for pile_index in range(len(PILE_KEYS))]
+_random = random.Random(8334)
+ZOBRIST = [_random.getrandbits(64) for _ in range(KEY_KINDS * CARD_COUNT * CARD_COUNT)]
+
+
+def card_key(kind, slot, card):
+    return ZOBRIST[(kind * CARD_COUNT + slot) * CARD_COUNT + card]
+
+
+def position_key(state):
+    # hash of the whole position
+    key = 0
+    for pile_index, pile in enumerate(state.piles):
+        kind = PILE_KEYS[pile_index]
+        down = state.down[pile_index]
+        for slot, card in enumerate(pile):
+            key ^= card_key(DOWN_KEYS[pile_index] if slot < down else kind, slot, card)
+    return key
+
+
+def move_key(state, move):
+    # how the position hash changes when a move is applied, worked out before applying it
+    kind, src, dst, count = move
+    piles = state.piles
+    key = 0
+    if kind == FLIP:
+        slot = state.down[src] - 1
+        card = piles[src][slot]
+        return card_key(DOWN_KEYS[src], slot, card) ^ card_key(PILE_KEYS[src], slot, card)
+    src_pile = piles[src]
+    src_kind = PILE_KEYS[src]
+    dst_kind = PILE_KEYS[dst]
+    size = len(src_pile)
+    slot = len(piles[dst])
+    if kind == MOVE:
+        cards = src_pile[size - count:]
+    else:
+        # draws and recycles reverse the cards
+        cards = src_pile[size - count:][::-1]
+    for i in range(count):
+        key ^= card_key(src_kind, size - count + i, src_pile[size - count + i])
+    for card in cards:
+        key ^= card_key(dst_kind, slot, card)
+        slot += 1
+    return key
+
+
+def foundation_levels(state):
+    # how many cards of each suit are on the foundations
+    levels = [0] * len(klondike.CARD_SUITS)
+    for pile_index in FOUNDATIONS:
+        pile = state.piles[pile_index]
+        if pile:
+            levels[SUIT[pile[-1]]] = len(pile)
+    return levels
+
+
+def is_safe(card, levels):
+    # a card can always go to its foundation once nothing could still need to be stacked on it
+    rank = RANK[card]
+    if rank <= 1:
+        return True
+    opposite = [levels[suit] for suit in range(len(levels)) if suit % 2 != COLOR[card]]
+    return min(opposite) >= rank
+
+
+def talon_cards(state):
+    # every card the talon can be made to show by turning the stock, returns the stock moves that
+    # turn it all and, per card, how many of them it takes to show it and the card
+    steps, reached = talon_reach(state.rule, bytes(state.piles[STOCK]), bytes(state.piles[TALON]))
+    return steps, list(reached)
+
+
+@functools.lru_cache(maxsize=TALON_CACHE_SIZE)
+def talon_reach(rule, stock_cards, talon_cards):
+    # talon_cards() for the stock and talon as they are, remembered: only a move from the talon
+    # changes them, so searches and playouts keep asking about the same few
+    stock = len(stock_cards)
+    talon = len(talon_cards)
+    # the cards don't change while only the stock is turned, so the lengths say where we are
+    reached = []
+    steps = []
+    visited = {talon}
+    while True:
+        if stock:
+            count = min(rule, stock)
+            steps.append(klondike.Move(DRAW, STOCK, TALON, count))
+            stock -= count
+            talon += count
+        elif talon and rule == klondike.STANDARD:
+            steps.append(klondike.Move(RECYCLE, TALON, STOCK, talon))
+            stock = talon
+            talon = 0
+            continue
+        else:
+            break
+        if talon in visited:
+            break
+        visited.add(talon)
+        # the talon is the old talon followed by the stock turned over, top first
+        total = len(talon_cards)
+        if talon <= total:
+            card = talon_cards[talon - 1]
+        else:
+            card = stock_cards[len(stock_cards) - (talon - total)]
+        reached.append((len(steps), card))
+    return tuple(steps), tuple(reached)
+
+
+def settle(state, key):
+    # play every move that can never be wrong: turning over tableau cards and safe
+    # foundation moves from the tableau, and from the talon when it is only dug into from the top
+    # (with recycling, taking a card out would change which cards later draws turn up), returns
+    # the moves played and the new position key
+    piles = state.piles
+    down = state.down
+    played = []
+    levels = foundation_levels(state)
+    sources = DUG_PILES[state.rule]
+    changed = True
+    while changed:
+        changed = False
+        for src in sources:
+            pile = piles[src]
+            if not pile:
+                continue
+            if down[src] == len(pile):
+                move = klondike.Move(FLIP, src, src, 0)
+            else:
+                card = pile[-1]
+                if levels[SUIT[card]] != RANK[card] or not is_safe(card, levels):
+                    continue
+                move = klondike.Move(MOVE, src, foundation_for(state, card), 1)
+                levels[SUIT[card]] += 1
+            key ^= move_key(state, move)
+            klondike.apply_move(state, move)
+            played.append(move)
+            changed = True
+    return played, key
+
+
+def is_dead(state, levels, sources=None):
+    # can the position be seen to be lost already? a card with a lower card of its own suit
+    # under it has to move to the tableau before that card can go up, and if neither card it can
+    # go on is still to be had (both on the foundations, or under it in the same pile) it never
+    # can, as cards never come back off the foundations in the search
+    # face up tableau cards above the first can still be carried off on the stack under them
+    # sources are the piles to look in, by default every pile it could happen in
+    piles = state.piles
+    for src in DUG_PILES[state.rule] if sources is None else sources:
+        pile = piles[src]
+        if src in TABLEAUS:
+            pile = pile[:state.down[src] + 1]
+        lowest = [klondike.KING + 1] * len(levels)
+        under = 0
+        for card in pile:
+            rank = RANK[card]
+            suit = SUIT[card]
+            if lowest[suit] < rank and rank != klondike.KING:
+                for parent in PARENTS[card]:
+                    if levels[SUIT[parent]] <= RANK[parent] and not under >> parent & 1:
+                        break
+                else:
+                    return True
+            if rank < lowest[suit]:
+                lowest[suit] = rank
+            under |= 1 << card
+    return False
+
+
+def dug_piles(state, moves):
+    # the piles moves changed that is_dead() checks, all of them once a card has gone up, as
+    # that can leave a card with nowhere to go in a pile that didn't change
+    dug = DUG_PILES[state.rule]
+    changed = set()
+    for move in moves:
+        if move.dst in FOUNDATIONS:
+            return dug
+        changed.add(move.src)
+        changed.add(move.dst)
+    return [pile_index for pile_index in dug if pile_index in changed]
+
+
+def foundation_for(state, card):
+    # the foundation a card goes on, the first empty one for an ace
+    piles = state.piles
+    for pile_index in FOUNDATIONS:
+        pile = piles[pile_index]
+        if pile and SUIT[pile[-1]] == SUIT[card]:
+            return pile_index
+    for pile_index in FOUNDATIONS:
+        if not piles[pile_index]:
+            return pile_index
+    return None
+
+
+def ordered_moves(state):
+    # moves worth searching, each a tuple of engine moves played together, worst first so
+    # the best is popped first
+    # moves that can't lead anywhere new are left out: turning the stock is folded into the
+    # talon card it brings up, the same king only goes to the first empty column, part of a
+    # stack only moves to free a card for a foundation, a column is only emptied when a king
+    # could use it, and cards never come back off the foundations
+    # with one pass through the stock, the stock isn't turned past a card that can safely go up,
+    # playing it first is never worse than burying it in the talon
+    piles = state.piles
+    down = state.down
+    levels = foundation_levels(state)
+    empty = None
+    for pile_index in TABLEAUS:
+        if not piles[pile_index]:
+            empty = pile_index
+            break
+    scored = []
+
+    # where a card could go on the tableau, the first empty column for a king
+    targets = {}
+    for dst in TABLEAUS:
+        pile = piles[dst]
+        if pile and down[dst] < len(pile):
+            top = pile[-1]
+            if RANK[top] > 0:
+                for card in NEEDS[top]:
+                    targets.setdefault(card, []).append(dst)
+
+    steps, talon = talon_cards(state)
+    kings_waiting = any(RANK[card] == klondike.KING for _, card in talon) or (
+        piles[TALON] and RANK[piles[TALON][-1]] == klondike.KING)
+
+    for src in TABLEAUS:
+        pile = piles[src]
+        size = len(pile)
+        first = down[src]
+        if first >= size:
+            continue
+        top = pile[-1]
+        # up to a foundation
+        if levels[SUIT[top]] == RANK[top]:
+            scored.append((7, 0, (klondike.Move(MOVE, src, foundation_for(state, top), 1),)))
+        for slot in range(first, size):
+            if slot > first:
+                # part of a stack, only to free the card under it for a foundation (checked first,
+                # as it rules out most of the stack)
+                under = pile[slot - 1]
+                if levels[SUIT[under]] != RANK[under]:
+                    continue
+            card = pile[slot]
+            count = size - slot
+            if RANK[card] == klondike.KING:
+                dsts = [empty] if empty is not None and slot > 0 else []
+            else:
+                dsts = targets.get(card, ())
+            if not dsts:
+                continue
+            if slot > first:
+                priority = 2
+            elif slot > 0:
+                # uncovers a face down card
+                priority = 6
+            else:
+                # empties the column, only worth it for a king to go there
+                if not kings_waiting and not any(
+                        RANK[piles[other][down[other]]] == klondike.KING and down[other] > 0
+                        for other in TABLEAUS if down[other] < len(piles[other])):
+                    continue
+                priority = 5
+            for dst in dsts:
+                scored.append((priority, 0, (klondike.Move(MOVE, src, dst, count),)))
+
+    # cards from the talon, now or after turning the stock
+    # the card showing now first, so it comes before any the stock is turned past
+    if piles[TALON]:
+        talon.insert(0, (0, piles[TALON][-1]))
+    for count, card in talon:
+        if levels[SUIT[card]] == RANK[card]:
+            scored.append((4, -count, (*steps[:count], klondike.Move(MOVE, TALON, foundation_for(state, card), 1))))
+            if state.rule == klondike.VEGAS and is_safe(card, levels):
+                break
+        if RANK[card] == klondike.KING:
+            dsts = [empty] if empty is not None else []
+        else:
+            dsts = targets.get(card, ())
+        for dst in dsts:
+            scored.append((3, -count, (*steps[:count], klondike.Move(MOVE, TALON, dst, 1))))
+    scored.sort(key=lambda item: (item[0], item[1]))
+    return [moves for _, _, moves in scored]
+
+
+def solve(state, max_nodes=MAX_NODES, max_seconds=MAX_SECONDS, stop=None):
+    # search for a win from the given position, which is left untouched
+    # no win found means none exists among the moves ordered_moves keeps
+    # stop, if given, is called along with the clock and ends the search as unknown when it is true
+    started = time.perf_counter()
+    deadline = started + max_seconds
+    state = state.copy()
+    settled, key = settle(state, position_key(state))
+    line = [tuple(settled)]
+    # every position reached so far, a position seen before was either searched already
+    # or is on the current line
+    seen = {key}
+    keys = [key]
+    nodes = 0
+    status = SOLVABLE if klondike.is_won(state) else NO_WIN
+    stack = [ordered_moves(state)] if status == NO_WIN else []
+    while stack:
+        options = stack[-1]
+        if not options:
+            # nothing left to try here, step back
+            stack.pop()
+            if len(line) > 1:
+                for move in reversed(line.pop()):
+                    klondike.undo_move(state, move)
+                keys.pop()
+                key = keys[-1]
+            continue
+
+        nodes += 1
+        if nodes > max_nodes or (nodes % CLOCK_INTERVAL == 0 and (
+                time.perf_counter() > deadline or (stop is not None and stop()))):
+            status = UNKNOWN
+            break
+
+        moves = options.pop()
+        next_key = key
+        for move in moves:
+            next_key ^= move_key(state, move)
+            klondike.apply_move(state, move)
+        settled, next_key = settle(state, next_key)
+        moves += tuple(settled)
+        if next_key in seen:
+            for move in reversed(moves):
+                klondike.undo_move(state, move)
+            continue
+        seen.add(next_key)
+        levels = foundation_levels(state)
+        if is_dead(state, levels, dug_piles(state, moves)):
+            for move in reversed(moves):
+                klondike.undo_move(state, move)
+            continue
+        line.append(moves)
+        keys.append(next_key)
+        key = next_key
+        # won, every card on the foundations
+        if sum(levels) == CARD_COUNT:
+            status = SOLVABLE
+            break
+        stack.append(ordered_moves(state))
+
+    moves = [move for moves in line for move in moves] if status == SOLVABLE else []
+    return Result(status, moves, nodes, time.perf_counter() - started)
+
+
+# worker side, the latest search the game asked for, a search for an older one stops early
+_request = None
+
+
+def _init_worker(request):
+    global _request
+    _request = request
+
+
+def solve_packed(packed, request, max_nodes, max_seconds):
+    # worker task, solve() for a packed state, given up as unknown once the game asks for another
+    return solve(klondike.State.unpack(packed), max_nodes, max_seconds,
+                 stop=lambda: _request is not None and _request.value != request)
+
+
+class BackgroundSolver:
+    # runs solve() in a worker process, so a search the length of a full budget never holds up a
+    # frame, poll() never waits for it
+    def __init__(self):
+        # bumped for every search started or dropped, shared with the worker so it can stop early
+        self.request = multiprocessing.RawValue("i", 0)
+        self.pool = ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(self.request,))
+        self.future = None
+
+    def start(self, state, max_nodes=MAX_NODES, max_seconds=MAX_SECONDS):
+        # search from state, dropping any search still running
+        self.cancel()
+        self.future = self.pool.submit(solve_packed, state.pack(), self.request.value, max_nodes, max_seconds)
+
+    def cancel(self):
+        self.request.value += 1
+        if self.future is not None:
+            self.future.cancel()
+            self.future = None
+
+    def poll(self):
+        # the Result of the search once it is done, None while it runs or if there is none
+        if self.future is None or not self.future.done():
+            return None
+        future = self.future
+        self.future = None
+        return future.result()
+
+    def close(self):
+        self.request.value += 1
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def describe(move):
+    # short human readable move, for reports
+    kind, src, dst, count = move
+    if kind == DRAW:
+        return "draw"
+    if kind == RECYCLE:
+        return "recycle"
+    if kind == FLIP:
+        return f"flip {pile_name(src)}"
+    return f"{count} {pile_name(src)}->{pile_name(dst)}"
+
+
+def pile_name(pile_index):
+    if pile_index == STOCK:
+        return "stock"
+    if pile_index == TALON:
+        return "talon"
+    if pile_index in TABLEAUS:
+        return f"t{pile_index - TABLEAUS[0] + 1}"
+    return f"f{pile_index - FOUNDATION_1 + 1}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve a range of Klondike deals.")
+    parser.add_argument("--games", type=int, default=10, help="number of deals to solve")
+    parser.add_argument("--first-deal", type=int, default=0, help="first deal id")
+    parser.add_argument("--vegas", action="store_true", help="vegas draw-1 rules instead of standard draw-3")
+    parser.add_argument("--nodes", type=int, default=MAX_NODES, help="node budget per deal")
+    parser.add_argument("--seconds", type=float, default=MAX_SECONDS, help="time budget per deal")
+    parser.add_argument("--line", action="store_true", help="print the winning line of solvable deals")
+    args = parser.parse_args()
+
+    rule = klondike.VEGAS if args.vegas else klondike.STANDARD
+    totals = {SOLVABLE: 0, NO_WIN: 0, UNKNOWN: 0}
+    for deal_id in range(args.first_deal, args.first_deal + args.games):
+        result = solve(klondike.deal(deals.deal(deal_id), rule), args.nodes, args.seconds)
+        totals[result.status] += 1
+        print(f"deal {deal_id}: {result.status}, {len(result.moves)} moves, "
+              f"{result.nodes} nodes, {result.seconds:.3f}s")
+        if args.line and result.moves:
+            print("  " + ", ".join(describe(move) for move in result.moves))
+    print(", ".join(f"{count} {status}" for status, count in totals.items()))
+
+
+if __name__ == "__main__":
+    main()
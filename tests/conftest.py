@@ -0,0 +1,8 @@
+# the game's modules sit at the top of the repo, not in a package, so put it on the path
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# tests that open a game window do it headless, must be set before arcade is imported
+os.environ.setdefault("ARCADE_HEADLESS", "1")
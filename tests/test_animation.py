@@ -0,0 +1,25 @@
+import arcade
+
+import animation
+
+
+def card_at(x, y):
+    sprite = arcade.SpriteSolidColor(10, 10, arcade.color.RED)
+    sprite.position = (x, y)
+    return sprite
+
+
+def test_a_card_moved_again_while_flying_sets_off_from_where_it_is_shown():
+    layer = arcade.SpriteList()
+    flight = animation.Animation(layer)
+    card, other = card_at(100, 0), card_at(0, 100)
+    flight.add([card, other], [(0, 0), (0, 0)])
+    flight.step(flight.seconds / 2)
+    shown = tuple(flight.positions()[0])
+    card.position = (300, 0)
+    flight.add([card], [(100, 0)])
+    assert len(layer) == 2
+    assert flight.cards == [other, card]
+    assert tuple(flight.positions()[1]) == shown
+    assert flight.step(flight.seconds) and tuple(flight.positions()[1]) == (300, 0)
+    assert flight.finish() == [other, card] and len(layer) == 0
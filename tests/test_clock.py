@@ -0,0 +1,43 @@
+import random
+
+import klondike
+from clock import GameClock, TICKS_PER_SECOND
+
+FRAME_RATES = (30, 60, 144, 240)
+SECONDS = 95
+
+
+def run(clock, frame_times):
+    # the clock advanced once per frame, returns the total score change
+    return sum(clock.advance(delta_time) for delta_time in frame_times)
+
+
+def test_the_same_game_time_at_any_frame_rate():
+    for frame_rate in FRAME_RATES:
+        clock = GameClock(klondike.STANDARD)
+        penalty = run(clock, [1 / frame_rate] * (SECONDS * frame_rate))
+        assert clock.ticks == SECONDS * TICKS_PER_SECOND, frame_rate
+        assert clock.seconds == SECONDS
+        assert penalty == -klondike.time_penalty(SECONDS), frame_rate
+
+
+def test_uneven_frames_add_up_to_the_same_ticks():
+    # a frame rate that wobbles, and the odd long stall, still only counts the time that passed
+    rng = random.Random(12)
+    frame_times = [rng.choice((1 / 30, 1 / 60, 1 / 144, 1 / 240, 0.5)) for _ in range(2000)]
+    clock = GameClock(klondike.STANDARD)
+    penalty = run(clock, frame_times)
+    expected = int(sum(frame_times) * TICKS_PER_SECOND + 1e-6)
+    assert abs(clock.ticks - expected) <= 1
+    assert penalty == -klondike.time_penalty(clock.seconds)
+
+
+def test_no_penalty_under_vegas_or_once_stopped():
+    vegas = GameClock(klondike.VEGAS)
+    assert run(vegas, [1 / 60] * (SECONDS * 60)) == 0
+    assert vegas.seconds == SECONDS
+    clock = GameClock(klondike.STANDARD)
+    run(clock, [1 / 144] * 144)
+    clock.stop()
+    assert run(clock, [1 / 144] * (SECONDS * 144)) == 0
+    assert clock.seconds == 1
@@ -0,0 +1,33 @@
+import numpy as np
+
+import deals
+from klondike import CARD_COUNT
+
+DEAL_IDS = [0, 1, 2, 51, 52, 1000, 123456789, deals.MAX_DEAL_ID - 1, deals.MAX_DEAL_ID]
+
+
+def test_one_deal_matches_its_row_of_many():
+    many = deals.deals(DEAL_IDS)
+    assert many.shape == (len(DEAL_IDS), CARD_COUNT) and many.dtype == np.uint8
+    for row, deal_id in zip(many, DEAL_IDS):
+        assert deals.deal(deal_id) == row.tolist()
+    in_a_row = deals.deal_range(995, 10)
+    for offset, row in enumerate(in_a_row):
+        assert deals.deal(995 + offset) == row.tolist()
+
+
+def test_every_deal_is_a_whole_pack():
+    for row in deals.deal_range(0, 2000):
+        assert sorted(row.tolist()) == list(range(CARD_COUNT))
+    for row in deals.deals(DEAL_IDS):
+        assert sorted(row.tolist()) == list(range(CARD_COUNT))
+
+
+def test_deals_dont_change():
+    # the same layout from one call to the next, and from one release to the next
+    assert deals.deal(1000) == deals.deal(1000)
+    assert (deals.deal_range(0, 50) == deals.deal_range(0, 50)).all()
+    assert deals.deal(0)[:10] == [48, 21, 10, 18, 41, 49, 3, 33, 20, 40]
+    assert deals.deal(deals.MAX_DEAL_ID)[:10] == [13, 0, 17, 42, 51, 19, 39, 30, 16, 22]
+    # and different deal ids give different layouts
+    assert len({bytes(row) for row in deals.deal_range(0, 2000)}) == 2000
@@ -0,0 +1,182 @@
+# the game window, run headless
+import gc
+import os
+import random
+
+import arcade
+import pytest
+
+import instrument
+import klondike
+import layout
+import main
+import savegame
+import solver
+import textures
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def game(tmp_path, monkeypatch):
+    # a game window, run from a directory where the card images are found: textures.py names them
+    # relative to a venv in the working directory
+    if not os.path.exists(os.path.join(ROOT, textures.FACE_DOWN_IMAGE)):
+        resources = os.path.join(tmp_path, "venv", "Lib", "site-packages")
+        os.makedirs(resources)
+        os.symlink(os.path.dirname(os.path.dirname(arcade.__file__)) + "/arcade",
+                   os.path.join(resources, "arcade"))
+        monkeypatch.chdir(tmp_path)
+    else:
+        monkeypatch.chdir(ROOT)
+    try:
+        window = main.Game(save_path=str(tmp_path / "games.kls"))
+    except Exception as error:
+        pytest.skip(f"no headless window here: {error}")
+    yield window
+    window.close()
+    # collect the closed window now, collected later it takes the next test's window with it
+    gc.collect()
+
+
+def test_restore_a_game_that_moves_cards_more_than_once(game):
+    # restoring plays every saved move in one batch, and cards go back and forth in a real game
+    rng = random.Random(3)
+    game.setup(1)
+    for _ in range(150):
+        moves = klondike.legal_moves(game.state)
+        if not moves:
+            break
+        game.play(rng.choice(moves))
+    saved = game.saved_game()
+    game.restore(saved)
+    assert game.state.pack() == savegame.replay(saved).pack()
+    assert not game.animation.cards
+    for pile_index, pile in enumerate(game.piles):
+        assert [card.info.id for card in pile] == list(game.state.piles[pile_index])
+
+
+def test_a_replay_left_part_way_keeps_the_saved_game(game):
+    # R during a replay starts a new game without saving the moves replayed so far over the whole one
+    rng = random.Random(4)
+    game.setup(2)
+    for _ in range(60):
+        game.play(rng.choice(klondike.legal_moves(game.state)))
+    game.archive_game()
+    data = open(game.save_path, "rb").read()
+    saved, offset = savegame.load_last(data)
+    game.restore(saved, 4, offset)
+    for _ in range(20):
+        game.on_update(1 / 60)
+    assert game.log and game.replay_moves
+    game.on_key_press(arcade.key.R, 0)
+    assert open(game.save_path, "rb").read() == data
+
+
+def test_no_moves_once_the_game_is_won(game):
+    # the win bonus is taken once, so a won game stays won
+    game.setup(0)
+    game.apply_moves(solver.solve(game.state.copy()).moves)
+    assert game.win == "YOU WIN!"
+    won = game.state.pack()
+    # drag the king of clubs back down to the first column
+    x, y = layout.card_position(klondike.FOUNDATION_1, 12)
+    game.on_mouse_press(x, y, arcade.MOUSE_BUTTON_LEFT, 0)
+    assert not game.held_cards
+    game.on_mouse_release(*layout.card_position(klondike.TABLEAU_1, 0), arcade.MOUSE_BUTTON_LEFT, 0)
+    game.redo()
+    assert game.state.pack() == won
+    assert savegame.verify(game.saved_game())
+
+
+def test_undo_and_redo_take_the_vegas_total_with_them(game, monkeypatch):
+    # the Vegas total carries between games, so undo has to give back what a move won
+    monkeypatch.setattr(main, "VEGAS_SCORE", 0)
+    monkeypatch.setattr(main, "GAME_RULE", klondike.STANDARD)
+    game.on_key_press(arcade.key.V, 0)
+    assert main.VEGAS_SCORE == klondike.VEGAS_BUY_IN
+    # deal 1 starts with an ace face up in the second column
+    game.setup(1)
+    before = main.VEGAS_SCORE, game.state.score
+    game.play(klondike.Move(klondike.MOVE, klondike.TABLEAU_2, klondike.FOUNDATION_1, 1))
+    after = main.VEGAS_SCORE, game.state.score
+    assert after == (before[0] + klondike.VEGAS_FOUNDATION_SCORE, before[1] + klondike.VEGAS_FOUNDATION_SCORE)
+    game.on_key_press(arcade.key.Z, 0)
+    assert (main.VEGAS_SCORE, game.state.score) == before
+    game.on_key_press(arcade.key.Y, 0)
+    assert (main.VEGAS_SCORE, game.state.score) == after
+
+
+def test_a_move_into_a_decided_position_finishes_the_game(game, monkeypatch):
+    # the move that leaves nothing to chance sends every card up in one batch, and wins once
+    game.setup(0)
+    line = solver.solve(game.state.copy()).moves
+    # play the winning line up to the move that decides the game
+    state = game.state.copy()
+    for made, move in enumerate(line):
+        klondike.apply_move(state, move)
+        if klondike.can_auto_complete(state):
+            break
+    game.apply_moves(line[:made])
+    # what the move and every card going up after it score
+    state = game.state.copy()
+    total = klondike.apply_move(state, move)
+    total += sum(klondike.apply_move(state, sent) for sent in klondike.foundation_moves(state))
+    wins = []
+    winner = game.winner
+    monkeypatch.setattr(game, "winner", lambda: wins.append(winner()))
+    before = game.score
+    game.play(move)
+    assert klondike.is_won(game.state)
+    assert len(wins) == 1
+    assert game.score == before + total + klondike.win_bonus(game.clock.seconds)
+
+
+def test_s_only_searches_standard_games(game, monkeypatch):
+    # the search can't settle draw 1 positions in time, so a Vegas game doesn't start one
+    monkeypatch.setattr(main, "VEGAS_SCORE", 0)
+    monkeypatch.setattr(main, "GAME_RULE", klondike.STANDARD)
+    game.on_key_press(arcade.key.V, 0)
+    game.on_key_press(arcade.key.S, 0)
+    assert game.solver is None
+    assert game.solver_text.text == "draw 3 only"
+
+
+def sprite_hit(game, x, y):
+    # what the sprites say is under a point, the topmost card or else a mat, like check_hit_test
+    cards = []
+    for pile_index in main.LAYER_ORDER:
+        cards += arcade.get_sprites_at_point((x, y), game.layers[pile_index])
+    if cards:
+        return cards[-1].pile, cards[-1].slot
+    mats = arcade.get_sprites_at_point((x, y), game.pile_mat_list)
+    return (game.pile_mat_list.index(mats[0]), None) if mats else None
+
+
+def test_hit_test_agrees_with_the_sprites(game):
+    # points on and either side of every card and mat edge and corner, where the layout and the
+    # sprite hit boxes are most likely to differ
+    rng = random.Random(9)
+    game.setup(5)
+    for _ in range(120):
+        game.apply_move(rng.choice(klondike.legal_moves(game.state)))
+    game.land_cards()
+    game.dirty_layers.update(range(klondike.PILE_COUNT))
+    game.update_layers()
+    for sprite in list(game.cards) + list(game.pile_mat_list):
+        for x in (sprite.left, sprite.center_x, sprite.right):
+            for y in (sprite.bottom, sprite.center_y, sprite.top):
+                for dx in (-1, -0.5, 0, 0.5, 1):
+                    for dy in (-1, -0.5, 0, 0.5, 1):
+                        point = x + dx, y + dy
+                        assert layout.hit_test(*point, game.state.piles) == sprite_hit(game, *point), point
+
+
+def test_instruments_count_every_texture_load(game):
+    # loads through arcade's own names for load_texture count, a sprite from a file as well
+    instrument.count_texture_loads()
+    instrument.count_texture_loads()
+    before = instrument.texture_loads
+    arcade.load_texture(textures.FACE_DOWN_IMAGE)
+    arcade.Sprite(textures.FACE_DOWN_IMAGE)
+    assert instrument.texture_loads == before + 2
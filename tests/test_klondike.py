@@ -0,0 +1,121 @@
+import random
+
+import deals
+import klondike
+import solver
+
+
+def play(deal_id, rule, steps, seed):
+    # yields the state over random play with now and then an undo
+    rng = random.Random(seed)
+    state = klondike.deal(deals.deal(deal_id), rule)
+    made = []
+    for _ in range(steps):
+        yield state
+        if made and rng.random() < 0.2:
+            klondike.undo_move(state, made.pop())
+            continue
+        moves = klondike.legal_moves(state)
+        if not moves:
+            return
+        move = rng.choice(moves)
+        klondike.apply_move(state, move)
+        made.append(move)
+
+
+def test_move_generator_matches_legal_moves():
+    for deal_id in range(20):
+        for rule in (klondike.STANDARD, klondike.VEGAS):
+            state = klondike.deal(deals.deal(deal_id), rule)
+            generator = klondike.MoveGenerator(state)
+            rng = random.Random(deal_id)
+            made = []
+            for _ in range(300):
+                assert sorted(generator.moves()) == sorted(klondike.legal_moves(state))
+                if made and rng.random() < 0.2:
+                    generator.undo(made.pop())
+                    continue
+                moves = generator.moves()
+                if not moves:
+                    break
+                move = rng.choice(moves)
+                assert generator.is_legal(move)
+                generator.apply(move)
+                made.append(move)
+
+
+def test_undo_reverses_apply():
+    for deal_id in range(20):
+        for state in play(deal_id, klondike.STANDARD, 300, deal_id):
+            before = state.pack()
+            for move in klondike.legal_moves(state):
+                score = klondike.apply_move(state, move)
+                assert klondike.undo_move(state, move) == score
+                assert state.pack() == before, move
+
+
+def test_pack_round_trip():
+    for deal_id in range(20):
+        for state in play(deal_id, klondike.VEGAS, 300, deal_id):
+            packed = state.pack()
+            copy = klondike.State.unpack(packed)
+            assert copy.pack() == packed
+            assert copy.piles == state.piles
+            assert copy.down == state.down
+            assert (copy.rule, copy.score) == (state.rule, state.score)
+
+
+def test_history_keeps_the_last_limit_moves():
+    history = klondike.History(limit=3)
+    moves = [klondike.Move(klondike.DRAW, klondike.STOCK, klondike.TALON, 1)] * 4
+    for score, move in enumerate(moves):
+        history.record(move, score)
+    # the oldest of the four dropped off
+    assert [history.undo().score for _ in range(3)] == [3, 2, 1]
+    assert history.undo() is None
+    # redo hands back the same deltas, latest undone first
+    assert history.redo() == klondike.Delta(moves[1], 1)
+    assert history.redo() == klondike.Delta(moves[2], 2)
+    # and a new move ends it
+    history.record(moves[0], 9)
+    assert history.redo() is None
+    assert history.undo() == klondike.Delta(moves[0], 9)
+    assert history.undo() == klondike.Delta(moves[2], 2)
+
+
+def decided(deal_id):
+    # a deal played by the solver's winning line up to the first position that can't be lost
+    state = klondike.deal(deals.deal(deal_id))
+    for move in solver.solve(state.copy()).moves:
+        if klondike.can_auto_complete(state):
+            return state
+        klondike.apply_move(state, move)
+    raise AssertionError("the winning line never got to a decided position")
+
+
+def test_foundation_moves_win_a_decided_position():
+    state = decided(0)
+    before = state.pack()
+    moves = klondike.foundation_moves(state)
+    # worked out on a copy
+    assert state.pack() == before
+    for move in moves:
+        assert klondike.is_legal(state, move)
+        klondike.apply_move(state, move)
+    assert klondike.is_won(state)
+
+
+def test_foundation_moves_turn_over_uncovered_cards():
+    # an ace on a face down two of the same suit, the two goes up once it is turned over
+    state = klondike.State([bytearray() for _ in range(klondike.PILE_COUNT)], bytearray(klondike.PILE_COUNT))
+    state.piles[klondike.TABLEAU_1] = bytearray([1, 0])
+    state.down[klondike.TABLEAU_1] = 1
+    assert klondike.foundation_moves(state) == [
+        klondike.Move(klondike.MOVE, klondike.TABLEAU_1, klondike.FOUNDATION_1, 1),
+        klondike.Move(klondike.FLIP, klondike.TABLEAU_1, klondike.TABLEAU_1, 0),
+        klondike.Move(klondike.MOVE, klondike.TABLEAU_1, klondike.FOUNDATION_1, 1),
+    ]
+    # nothing to send up
+    state.piles[klondike.TABLEAU_1] = bytearray([4])
+    state.down[klondike.TABLEAU_1] = 0
+    assert klondike.foundation_moves(state) == []
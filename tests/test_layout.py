@@ -0,0 +1,92 @@
+import layout
+from klondike import PILE_COUNT, STOCK, TALON, TABLEAU_1, TABLEAU_2, FOUNDATION_1
+from layout import (CARD_CORNER, CARD_HEIGHT, CARD_VERTICAL_OFFSET, CARD_WIDTH, MAT_HEIGHT, MAT_WIDTH,
+                    PILE_POSITIONS, X_SPACING)
+
+
+def piles(counts=None):
+    # piles of the given sizes, which is all hit testing looks at
+    counts = counts or {}
+    return [bytes(counts.get(pile_index, 0)) for pile_index in range(PILE_COUNT)]
+
+
+def test_a_long_column_hangs_over_the_stock_and_talon():
+    table = piles({STOCK: 5, TALON: 3, TABLEAU_1: 19, TABLEAU_2: 19})
+    for column, under in ((TABLEAU_1, STOCK), (TABLEAU_2, TALON)):
+        x, y = layout.card_position(column, 18)
+        stock_x, stock_y = PILE_POSITIONS[under]
+        assert y - CARD_HEIGHT / 2 < stock_y + CARD_HEIGHT / 2
+        # where they overlap the column's last card is on top
+        assert layout.hit_test(x, stock_y + CARD_HEIGHT / 2 - 1, table) == (column, 18)
+        # below it the stock or talon shows
+        assert layout.hit_test(x, y - CARD_HEIGHT / 2, table) == (under, len(table[under]) - 1)
+        # and with the column shorter, only the stock or talon is there
+        shorter = piles({STOCK: 5, TALON: 3, TABLEAU_1: 10, TABLEAU_2: 10})
+        assert layout.hit_test(x, stock_y + CARD_HEIGHT / 2 - 1, shorter) == (under, len(table[under]) - 1)
+
+
+def test_empty_mats():
+    table = piles()
+    for pile_index in range(PILE_COUNT):
+        x, y = PILE_POSITIONS[pile_index]
+        assert layout.hit_test(x, y, table) == (pile_index, None)
+        # the mat is bigger than a card
+        assert layout.hit_test(x + MAT_WIDTH / 2, y + MAT_HEIGHT / 2, table) == (pile_index, None)
+        assert layout.hit_test(x + MAT_WIDTH / 2 + 0.5, y, table) is None
+        assert layout.hit_test(x, y - MAT_HEIGHT / 2, table) is None
+
+
+def test_the_gap_between_columns():
+    table = piles({TABLEAU_1: 3, TABLEAU_2: 3})
+    x, y = layout.card_position(TABLEAU_1, 2)
+    assert layout.hit_test(x + X_SPACING / 2, y, table) is None
+    # past the edge of the card there is still mat, up where the mat is
+    mat_y = PILE_POSITIONS[TABLEAU_1][1]
+    assert layout.hit_test(x + CARD_WIDTH / 2 + 1, mat_y, table) == (TABLEAU_1, None)
+    # but the column hangs below its mat, and beside it there is only table
+    assert y - CARD_HEIGHT / 2 + 5 < mat_y - MAT_HEIGHT / 2
+    assert layout.hit_test(x + CARD_WIDTH / 2 + 1, y - CARD_HEIGHT / 2 + 5, table) is None
+    assert layout.hit_test(x + CARD_WIDTH / 2 - 1, y - CARD_HEIGHT / 2 + 5, table) == (TABLEAU_1, 2)
+    assert layout.hit_test(x + MAT_WIDTH / 2 + 1, mat_y, table) is None
+    # off the end of the row of columns
+    assert layout.hit_test(PILE_POSITIONS[TABLEAU_1 + 6][0] + X_SPACING / 2, mat_y, table) is None
+
+
+def test_card_edges_and_corners():
+    # the same edges as the sprites' hit boxes: right and top in, left and bottom out, corners cut
+    table = piles({FOUNDATION_1: 1})
+    x, y = PILE_POSITIONS[FOUNDATION_1]
+    right, top = x + CARD_WIDTH / 2, y + CARD_HEIGHT / 2
+    left, bottom = x - CARD_WIDTH / 2, y - CARD_HEIGHT / 2
+    assert layout.hit_test(right, y, table) == (FOUNDATION_1, 0)
+    assert layout.hit_test(x, top, table) == (FOUNDATION_1, 0)
+    assert layout.hit_test(left, y, table) == (FOUNDATION_1, None)
+    assert layout.hit_test(x, bottom, table) == (FOUNDATION_1, None)
+    assert layout.hit_test(right - CARD_CORNER, top, table) == (FOUNDATION_1, 0)
+    assert layout.hit_test(right - CARD_CORNER / 4, top - CARD_CORNER / 4, table) == (FOUNDATION_1, None)
+
+
+def test_a_cut_corner_shows_the_card_above():
+    table = piles({TABLEAU_1: 2})
+    x, y = layout.card_position(TABLEAU_1, 1)
+    corner = x + CARD_WIDTH / 2 - CARD_CORNER / 4, y + CARD_HEIGHT / 2 - CARD_CORNER / 4
+    assert layout.hit_test(*corner, table) == (TABLEAU_1, 0)
+    # with nothing under a bottom corner, the point is off the column
+    assert layout.hit_test(corner[0], y - CARD_HEIGHT / 2 + CARD_CORNER / 4, table) is None
+
+
+def test_drop_target():
+    table = piles({TABLEAU_1: 12, TABLEAU_2: 1})
+    # a card dropped a little off the top card of a column
+    x, y = layout.card_position(TABLEAU_1, 11)
+    assert layout.drop_target(x + 20, y - 30, table) == TABLEAU_1
+    # over the foundation mat
+    x, y = PILE_POSITIONS[FOUNDATION_1]
+    assert layout.drop_target(x - 30, y + 10, table) == FOUNDATION_1
+    # halfway between two columns it goes to the nearer one
+    x, y = layout.card_position(TABLEAU_2, 0)
+    assert layout.drop_target(x - X_SPACING / 2 + 5, y, table) == TABLEAU_2
+    # a card far below a short column touches nothing
+    assert layout.drop_target(x, y - CARD_VERTICAL_OFFSET - 2 * CARD_HEIGHT, table) is None
+    # off the side of the table
+    assert layout.drop_target(layout.SCREEN_WIDTH + CARD_WIDTH, y, table) is None
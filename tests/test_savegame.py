@@ -0,0 +1,75 @@
+import deals
+import klondike
+import savegame
+import solver
+from clock import TICKS_PER_SECOND
+
+
+def saved_game(deal_id, count):
+    # a deal with its first count legal moves made, as a SavedGame
+    state = klondike.deal(deals.deal(deal_id))
+    moves = []
+    for _ in range(count):
+        move = klondike.legal_moves(state)[0]
+        klondike.apply_move(state, move)
+        moves.append(savegame.encode_move(move))
+    return savegame.SavedGame(klondike.STANDARD, deal_id, None, 0, 0, state.score, moves)
+
+
+def test_dumps_loads_round_trip():
+    saved = saved_game(3, 40)
+    with_layout = saved._replace(deal_id=None, order=bytes(deals.deal(3)))
+    data = savegame.dumps(saved) + savegame.dumps(with_layout)
+    first, offset = savegame.loads(data)
+    second, end = savegame.loads(data, offset)
+    assert end == len(data)
+    for loaded, original in ((first, saved), (second, with_layout)):
+        assert loaded._replace(moves=list(loaded.moves)) == original
+    assert savegame.verify(first) and savegame.verify(second)
+
+
+def test_verify_catches_changed_games():
+    saved = saved_game(3, 40)
+    assert not savegame.verify(saved._replace(score=saved.score + 5))
+    # a move that can't be made at the start, a flip of a face up card
+    flip = savegame.encode_move(klondike.Move(klondike.FLIP, klondike.TABLEAU_1, klondike.TABLEAU_1, 0))
+    assert not savegame.verify(saved._replace(moves=[flip] + saved.moves))
+
+
+def test_append_at_an_offset_replaces_the_last_game(tmp_path):
+    path = tmp_path / "games.kls"
+    savegame.append(path, saved_game(1, 5))
+    savegame.append(path, saved_game(2, 5))
+    last, offset = savegame.load_last(path.read_bytes())
+    assert last.deal_id == 2
+    savegame.append(path, saved_game(2, 9), offset)
+    games = list(savegame.load_all(path.read_bytes()))
+    assert [(game.deal_id, len(game.moves)) for game in games] == [(1, 5), (2, 9)]
+
+
+def test_load_last_of_an_empty_archive():
+    assert savegame.load_last(b"") is None
+
+
+def won_game(deal_id):
+    # a standard deal played through to the win by the solver, as a SavedGame a minute and a half in
+    state = klondike.deal(deals.deal(deal_id))
+    moves = solver.solve(state.copy()).moves
+    for move in moves:
+        klondike.apply_move(state, move)
+    assert klondike.is_won(state)
+    seconds = 90
+    score = state.score - klondike.time_penalty(seconds) + klondike.win_bonus(seconds)
+    return savegame.SavedGame(klondike.STANDARD, deal_id, None, 0, seconds * TICKS_PER_SECOND, score,
+                              [savegame.encode_move(move) for move in moves])
+
+
+def test_the_win_bonus_stands_after_a_card_comes_back_off_a_foundation():
+    saved = won_game(0)
+    assert savegame.verify(saved)
+    # older games could go on after the win, the bonus was still taken at the time of it
+    king_down = klondike.Move(klondike.MOVE, klondike.FOUNDATION_1, klondike.TABLEAU_1, 1)
+    state = savegame.replay(saved)
+    score = klondike.apply_move(state, king_down)
+    later = saved._replace(score=saved.score + score, moves=saved.moves + [savegame.encode_move(king_down)])
+    assert savegame.verify(later)
@@ -0,0 +1,67 @@
+import json
+
+import klondike
+import server
+
+
+def request(game_server, **fields):
+    return game_server.handle(json.dumps(fields).encode())
+
+
+def test_bad_requests_are_turned_down():
+    game_server = server.Server()
+    assert request(game_server, op="deal", rule=[1]) == {"ok": False, "error": "rule must be standard or vegas"}
+    session = request(game_server, op="deal", deal=1)["session"]
+    for move in ("0010", [0, 0, 1], [0, 0, 1, 0, 0], [0.0, 0, 1, 0], [True, 0, 1, 0], None):
+        reply = request(game_server, op="move", session=session, move=move)
+        assert reply == {"ok": False, "error": "move must be [kind, src, dst, count]"}
+    assert not game_server.handle(b"{")["ok"]
+
+
+def test_unexpected_errors_become_replies():
+    game_server = server.Server()
+
+    def broken(request):
+        raise AttributeError("oops")
+    game_server.ops["deal"] = broken
+    reply = request(game_server, op="deal", id=7)
+    assert not reply["ok"] and reply["id"] == 7
+
+
+def test_history_is_trimmed_to_the_limit():
+    game_server = server.Server(history_limit=10)
+    session = request(game_server, op="deal", deal=1)["session"]
+    made = 0
+    while made < 200:
+        moves = request(game_server, op="moves", session=session)["moves"]
+        if not moves:
+            break
+        assert request(game_server, op="move", session=session, move=moves[0])["ok"]
+        made += 1
+        history = game_server.sessions[session].history
+        assert len(history) == min(made, 10) or 10 <= len(history) < 10 + server.HISTORY_TRIM
+    assert made == 200
+    # the last moves are the ones kept, so they undo back in order
+    assert request(game_server, op="undo", session=session)["ok"]
+
+
+def test_a_flip_with_a_wrong_dst_or_count_is_turned_down():
+    game_server = server.Server()
+    for deal_id in range(100):
+        # a deal where a card can be moved off a face down card (the first column has none) at once
+        session = request(game_server, op="deal", deal=deal_id)["session"]
+        moves = request(game_server, op="moves", session=session)["moves"]
+        moves = [move for move in moves if move[0] == klondike.MOVE and move[1] in klondike.TABLEAUS
+                 and move[1] != klondike.TABLEAU_1]
+        if moves:
+            break
+    src = moves[0][1]
+    assert request(game_server, op="move", session=session, move=moves[0])["ok"]
+    before = request(game_server, op="state", session=session)
+    for move in ([klondike.FLIP, src, 12, 100000], [klondike.FLIP, src, src, 1], [klondike.FLIP, src, 12, 0]):
+        reply = request(game_server, op="move", session=session, move=move)
+        assert reply == {"ok": False, "error": "illegal move"}
+    assert request(game_server, op="state", session=session) == before
+    assert request(game_server, op="move", session=session, move=[klondike.FLIP, src, src, 0])["ok"]
+    assert request(game_server, op="undo", session=session)["move"] == [klondike.FLIP, src, src, 0]
+    assert request(game_server, op="state", session=session) == before
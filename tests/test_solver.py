@@ -0,0 +1,101 @@
+import random
+import time
+
+import deals
+import klondike
+import solver
+from klondike import PILE_COUNT, TALON, TABLEAU_1, TABLEAU_2, FOUNDATION_1, FOUNDATION_2, MOVE
+
+CLUBS, HEARTS, SPADES = 0, 13, 26
+NINE_OF_CLUBS = CLUBS + 8
+TEN_OF_CLUBS = CLUBS + 9
+THREE_OF_HEARTS = HEARTS + 2
+EIGHT_OF_HEARTS = HEARTS + 7
+NINE_OF_HEARTS = HEARTS + 8
+NINE_OF_SPADES = SPADES + 8
+# both black tens are up, so nothing black is left for a red nine to go on
+BLACK_UP_TO_TEN = {FOUNDATION_1: range(CLUBS, CLUBS + 10), FOUNDATION_2: range(SPADES, SPADES + 10)}
+
+
+def position(piles, down=None, rule=klondike.STANDARD):
+    # a state with only the given piles, tableau cards face up unless down says otherwise
+    state = klondike.State([bytearray() for _ in range(PILE_COUNT)], bytearray(PILE_COUNT), rule)
+    for pile_index, cards in piles.items():
+        state.piles[pile_index] = bytearray(cards)
+    for pile_index, count in (down or {}).items():
+        state.down[pile_index] = count
+    return state
+
+
+def is_dead(state):
+    return solver.is_dead(state, solver.foundation_levels(state))
+
+
+def test_moving_between_columns_changes_the_key():
+    # the same card at the same slot of another column is a different position
+    before = position({TABLEAU_1: [NINE_OF_CLUBS, EIGHT_OF_HEARTS], TABLEAU_2: [NINE_OF_SPADES]})
+    after = position({TABLEAU_1: [NINE_OF_CLUBS], TABLEAU_2: [NINE_OF_SPADES, EIGHT_OF_HEARTS]})
+    move = klondike.Move(MOVE, TABLEAU_1, TABLEAU_2, 1)
+    assert klondike.is_legal(before, move)
+    assert solver.position_key(before) != solver.position_key(after)
+    assert solver.move_key(before, move) != 0
+    assert solver.position_key(before) ^ solver.move_key(before, move) == solver.position_key(after)
+
+
+def test_move_key_tracks_position_key():
+    # xoring in each move's key keeps the running key equal to the position's own
+    rng = random.Random(1)
+    for deal_id in range(20):
+        state = klondike.deal(deals.deal(deal_id))
+        key = solver.position_key(state)
+        for _ in range(200):
+            moves = klondike.legal_moves(state)
+            if not moves:
+                break
+            move = rng.choice(moves)
+            key ^= solver.move_key(state, move)
+            klondike.apply_move(state, move)
+            assert key == solver.position_key(state)
+
+
+def test_a_card_that_cant_get_off_a_lower_card_of_its_suit_is_dead():
+    # the nine of hearts has to go to the tableau before the three under it can go up, and can't
+    buried = {**BLACK_UP_TO_TEN, TALON: [THREE_OF_HEARTS, NINE_OF_HEARTS]}
+    assert is_dead(position(buried, rule=klondike.VEGAS))
+    # with recycling the talon goes back into the stock, and the three comes round first
+    assert not is_dead(position(buried, rule=klondike.STANDARD))
+    # the same in the tableau, the nine face up on the face down three and ten
+    column = {FOUNDATION_2: range(SPADES, SPADES + 10), TABLEAU_1: [THREE_OF_HEARTS, TEN_OF_CLUBS, NINE_OF_HEARTS]}
+    assert is_dead(position(column, {TABLEAU_1: 2}))
+    # but once the ten is face up the nine is carried off on it
+    assert not is_dead(position(column, {TABLEAU_1: 1}))
+
+
+def test_solve_results():
+    everything_up = {FOUNDATION_1 + suit: range(suit * 13, suit * 13 + 13) for suit in range(4)}
+    assert solver.solve(position(everything_up)).status == solver.SOLVABLE
+    # one card to go, which settle() plays
+    almost = {**everything_up, FOUNDATION_1 + 3: range(39, 51), TALON: [51]}
+    result = solver.solve(position(almost, rule=klondike.VEGAS))
+    assert result.status == solver.SOLVABLE and len(result.moves) == 1
+    # no moves at all
+    stuck = {TABLEAU_1: [THREE_OF_HEARTS, TEN_OF_CLUBS, NINE_OF_HEARTS]}
+    assert solver.solve(position(stuck, {TABLEAU_1: 2})).status == solver.NO_WIN
+    # a search that is told to stop gives up at the next look at the clock
+    result = solver.solve(klondike.deal(deals.deal(7), klondike.VEGAS), stop=lambda: True)
+    assert result.status == solver.UNKNOWN and result.nodes == solver.CLOCK_INTERVAL
+
+
+def test_background_solver_drops_an_old_search():
+    background = solver.BackgroundSolver()
+    try:
+        background.start(klondike.deal(deals.deal(7), klondike.VEGAS), max_seconds=60)
+        background.start(klondike.deal(deals.deal(0), klondike.VEGAS), max_seconds=60)
+        result = None
+        while result is None:
+            time.sleep(0.05)
+            result = background.poll()
+        assert result.status == solver.SOLVABLE
+        assert background.poll() is None
+    finally:
+        background.close()
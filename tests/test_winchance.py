@@ -0,0 +1,31 @@
+import random
+
+import deals
+import klondike
+import winchance
+from klondike import STOCK, TALON, TABLEAUS
+
+
+def test_shuffle_hidden_only_moves_unseen_cards():
+    state = klondike.deal(deals.deal(4), klondike.VEGAS)
+    for _ in range(5):
+        klondike.apply_move(state, klondike.stock_move(state))
+    face_up = [bytes(state.piles[pile_index][state.down[pile_index]:]) for pile_index in TABLEAUS]
+    talon = bytes(state.piles[TALON])
+    hidden = sorted(card for pile_index in TABLEAUS for card in state.piles[pile_index][:state.down[pile_index]])
+
+    # the stock is shuffled in with the face down cards until the player has seen it
+    shuffled = state.copy()
+    winchance.shuffle_hidden(shuffled, random.Random(1))
+    assert shuffled.piles[STOCK] != state.piles[STOCK]
+    assert sorted(shuffled.piles[STOCK] + b"".join(
+        shuffled.piles[pile_index][:shuffled.down[pile_index]] for pile_index in TABLEAUS)) == sorted(
+        hidden + list(state.piles[STOCK]))
+    # and is left in its order once it has come round
+    known = state.copy()
+    winchance.shuffle_hidden(known, random.Random(1), stock_seen=True)
+    assert known.piles[STOCK] == state.piles[STOCK]
+    for shuffled_state in (shuffled, known):
+        assert shuffled_state.piles[TALON] == talon
+        assert [bytes(shuffled_state.piles[pile_index][shuffled_state.down[pile_index]:])
+                for pile_index in TABLEAUS] == face_up
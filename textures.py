@@ -0,0 +1,38 @@
+import arcade
+
+# face down image
+FACE_DOWN_IMAGE = "venv/Lib/site-packages/arcade/resources/images/cards/cardBack_red2.png"
+# FACE_DOWN_IMAGE = ":resources:images/cards/cardBack_red2.png"
+
+# face up images, filled in with the card's suit and value
+FACE_UP_IMAGE = "venv/Lib/site-packages/arcade/resources/images/cards/card{suit}{value}.png"
+# FACE_UP_IMAGE = ":resources:images/cards/card{suit}{value}.png"
+
+# atlas size, fits 52 faces and the back (140x190 each) with room to spare
+ATLAS_SIZE = (2048, 1024)
+
+
+class CardTextures:
+    # loads every card texture once and packs them into one shared atlas
+    # needs an open window (OpenGL context) for the atlas
+    def __init__(self, values, suits):
+        # load the back and all faces from disk, only ever done here
+        self.back = arcade.load_texture(FACE_DOWN_IMAGE)
+        self.faces = {}
+        for suit in suits:
+            for value in values:
+                self.faces[value, suit] = arcade.load_texture(FACE_UP_IMAGE.format(suit=suit, value=value))
+
+        # pack everything into one atlas so card sprite lists never upload again
+        self.atlas = arcade.TextureAtlas(ATLAS_SIZE)
+        self.atlas.add(self.back)
+        for texture in self.faces.values():
+            self.atlas.add(texture)
+
+    def face(self, value, suit):
+        # shared face texture for a card
+        return self.faces[value, suit]
+
+    def sprite_list(self):
+        # new sprite list drawing from the shared atlas
+        return arcade.SpriteList(atlas=self.atlas)
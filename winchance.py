@@ -0,0 +1,163 @@
+# live win chance
+# worker processes play the current position out over and over, following the solver's move
+# order with a little randomness, and the share of games won is the win chance
+# the cards the player hasn't seen are shuffled for every playout, so the playouts can't look
+# ahead through them: the face down tableau cards, and the stock until it has been turned all the
+# way through once (under Vegas rules it never comes round, so it is always shuffled)
+import multiprocessing
+import os
+import random
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import klondike
+import solver
+
+# playouts per worker task, small so results come in several times a second
+BATCH = 50
+# playouts per position before it is left alone, about +-1.4% at worst
+TARGET = 5000
+# positions remembered, so going back to one (say with undo) shows its chance straight away
+CACHE_SIZE = 4096
+# a playout gives up after this many moves
+MAX_STEPS = 400
+# chance of passing over each move in the solver's order, so playouts don't all go the same way
+SKIP = 0.1
+
+# worker side, which position the game is on now, playouts for any other one stop early
+_generation = None
+
+
+def _init_worker(generation):
+    global _generation
+    _generation = generation
+
+
+def shuffle_hidden(state, rng, stock_seen=False):
+    # deal the cards the player can't know out again at random, the face down tableau cards and,
+    # unless stock_seen, the stock, shuffled together as one
+    slots = [(pile_index, slot) for pile_index in klondike.TABLEAUS for slot in range(state.down[pile_index])]
+    if not stock_seen:
+        slots += [(klondike.STOCK, slot) for slot in range(len(state.piles[klondike.STOCK]))]
+    cards = [state.piles[pile_index][slot] for pile_index, slot in slots]
+    rng.shuffle(cards)
+    for (pile_index, slot), card in zip(slots, cards):
+        state.piles[pile_index][slot] = card
+
+
+def passing_over(ordered, rng):
+    # the moves in order, each passed over at random, then all of them again in case every one
+    # taken leads back to a position already seen; lazy, as the first move taken is usually one of
+    # the first few
+    for moves in ordered:
+        if rng.random() >= SKIP:
+            yield moves
+    yield from ordered
+
+
+def playout(state, rng):
+    # play a position out, best move first, returns True if it was won
+    # a move back to a position already seen is passed over, and the game is lost when every
+    # move is passed over
+    key = solver.position_key(state)
+    seen = {key}
+    for _ in range(MAX_STEPS):
+        _, key = solver.settle(state, key)
+        if klondike.is_won(state):
+            return True
+        ordered = solver.ordered_moves(state)[::-1]
+        for moves in passing_over(ordered, rng):
+            new_key = key
+            for move in moves:
+                new_key ^= solver.move_key(state, move)
+                klondike.apply_move(state, move)
+            if new_key not in seen:
+                key = new_key
+                seen.add(key)
+                break
+            for move in reversed(moves):
+                klondike.undo_move(state, move)
+        else:
+            return False
+    return klondike.is_won(state)
+
+
+def run_playouts(key, packed, generation, count, seed, stock_seen):
+    # worker task, returns (key, wins, games) for up to count playouts of a packed state
+    # stops as soon as the game moves on, the playouts done so far still count
+    start = klondike.State.unpack(packed)
+    rng = random.Random(seed)
+    wins = games = 0
+    for _ in range(count):
+        if _generation is not None and _generation.value != generation:
+            break
+        state = start.copy()
+        shuffle_hidden(state, rng, stock_seen)
+        wins += playout(state, rng)
+        games += 1
+    return key, wins, games
+
+
+class WinChance:
+    # runs playouts of the live position in the background, poll() never waits for them
+    def __init__(self, workers=None):
+        # one core is left for the game itself by default, so drawing doesn't stutter
+        self.workers = workers or max(1, (os.cpu_count() or 1) - 1)
+        # bumped on every position change, shared with the workers so they can stop early
+        self.generation = multiprocessing.RawValue("i", 0)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                        initargs=(self.generation,))
+        # (rule, stock seen, position key) -> [wins, games], oldest first
+        self.cache = OrderedDict()
+        # position being played, as a cache key, its packed state and whether its stock is known
+        self.key = None
+        self.packed = None
+        self.stock_seen = False
+        # tasks sent and not back yet, and the position key of each
+        self.pending = {}
+        self.seed = 0
+
+    def set_position(self, state, stock_seen=False):
+        # the board changed, drop work on the old position and start on the new one
+        # stock_seen says the player has been through the whole stock, so its order is known
+        self.generation.value += 1
+        for future in self.pending:
+            future.cancel()
+        # the position key leaves out the rules, and they decide how many cards a draw turns over
+        self.key = (state.rule, stock_seen, solver.position_key(state))
+        self.packed = state.pack()
+        self.stock_seen = stock_seen
+        if self.key in self.cache:
+            self.cache.move_to_end(self.key)
+
+    def poll(self):
+        # collect finished playouts and keep the workers busy, returns (wins, games) so far
+        for future in [future for future in self.pending if future.done()]:
+            del self.pending[future]
+            if not future.cancelled():
+                self.add(*future.result())
+        if self.key is None:
+            return None
+        totals = self.cache.get(self.key, (0, 0))
+        in_flight = sum(1 for key in self.pending.values() if key == self.key)
+        while totals[1] + in_flight * BATCH < TARGET and in_flight < self.workers * 2:
+            self.seed += 1
+            future = self.pool.submit(run_playouts, self.key, self.packed, self.generation.value, BATCH, self.seed,
+                                      self.stock_seen)
+            self.pending[future] = self.key
+            in_flight += 1
+        return totals
+
+    def add(self, key, wins, games):
+        # results for any position are kept, even one the game has moved on from
+        if games == 0:
+            return
+        totals = self.cache.setdefault(key, [0, 0])
+        totals[0] += wins
+        totals[1] += games
+        if len(self.cache) > CACHE_SIZE:
+            self.cache.popitem(last=False)
+
+    def close(self):
+        self.generation.value += 1
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,117 @@
+# winnable deal index
+# an offline build solves a range of deals and writes the winnable deal ids for each rule set to
+# a file of sorted little endian uint32s, the game memory maps it and picks a random entry,
+# so a winnable deal costs one read with no solving and no loading the whole index
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+import deals
+import klondike
+import solver
+
+RULES = {"standard": klondike.STANDARD, "vegas": klondike.VEGAS}
+
+# deals per worker task
+CHUNK_SIZE = 200
+
+# index files live next to the game
+INDEX_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def index_path(rule, directory=INDEX_DIR):
+    name = "vegas" if rule == klondike.VEGAS else "standard"
+    return os.path.join(directory, f"winnable-{name}.u32")
+
+
+class WinnableDeals:
+    # the index files, mapped the first time each rule set is asked for
+    def __init__(self, directory=INDEX_DIR):
+        self.directory = directory
+        self.indexes = {}
+
+    def index(self, rule):
+        # the memory mapped ids for a rule set, or None if that index hasn't been built
+        if rule not in self.indexes:
+            path = index_path(rule, self.directory)
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                self.indexes[rule] = np.memmap(path, dtype="<u4", mode="r")
+            else:
+                self.indexes[rule] = None
+        return self.indexes[rule]
+
+    def random_deal_id(self, rule):
+        # a random winnable deal id, or None without an index
+        ids = self.index(rule)
+        if ids is None:
+            return None
+        return int(ids[random.randrange(len(ids))])
+
+    def is_winnable(self, rule, deal_id):
+        # is a deal in the index? only pages near the answer are read
+        ids = self.index(rule)
+        if ids is None:
+            return False
+        at = int(np.searchsorted(ids, deal_id))
+        return at < len(ids) and int(ids[at]) == deal_id
+
+
+def solve_chunk(start, count, rule, max_nodes, max_seconds):
+    # worker task, the solvable deal ids from start .. start + count
+    winnable = []
+    for deal_id, order in enumerate(deals.deal_range(start, count).tolist(), start):
+        if solver.solve(klondike.deal(order, rule), max_nodes, max_seconds).status == solver.SOLVABLE:
+            winnable.append(deal_id)
+    return winnable
+
+
+def build(rule, games, first_deal=0, workers=None, chunk_size=CHUNK_SIZE, max_nodes=solver.MAX_NODES,
+          max_seconds=solver.MAX_SECONDS):
+    # solve games deals over a process pool, returns the winnable ids sorted
+    # deals the solver gives up on are left out, the index only holds proven wins
+    workers = workers or os.cpu_count() or 1
+    winnable = []
+    chunks = ((start, min(chunk_size, first_deal + games - start))
+              for start in range(first_deal, first_deal + games, chunk_size))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for start, count in chunks:
+            pending.add(pool.submit(solve_chunk, start, count, rule, max_nodes, max_seconds))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    winnable.extend(future.result())
+        for future in pending:
+            winnable.extend(future.result())
+    return np.unique(np.array(winnable, dtype="<u4"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the winnable deal indexes for the game.")
+    parser.add_argument("--games", type=int, default=1000000, help="number of deals to solve per rule set")
+    parser.add_argument("--first-deal", type=int, default=0, help="first deal id")
+    parser.add_argument("--rules", default="standard,vegas", help="comma separated: standard, vegas")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--nodes", type=int, default=solver.MAX_NODES, help="solver node budget per deal")
+    parser.add_argument("--seconds", type=float, default=solver.MAX_SECONDS, help="solver time budget per deal")
+    parser.add_argument("--out", default=INDEX_DIR, help="directory to write the indexes to")
+    parser.add_argument("--merge", action="store_true", help="add to the existing indexes, not replace them")
+    args = parser.parse_args()
+
+    for name in args.rules.split(","):
+        started = time.perf_counter()
+        ids = build(RULES[name], args.games, args.first_deal, args.workers, max_nodes=args.nodes,
+                    max_seconds=args.seconds)
+        path = index_path(RULES[name], args.out)
+        if args.merge and os.path.exists(path):
+            ids = np.union1d(np.fromfile(path, dtype="<u4"), ids).astype("<u4")
+        ids.tofile(path)
+        print(f"{name}: {len(ids)} winnable deals, {time.perf_counter() - started:.1f}s, wrote {path}")
+
+
+if __name__ == "__main__":
+    main()